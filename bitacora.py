@@ -0,0 +1,92 @@
+# bitacora.py
+# Bitácora (append-only) de la generación de equipos: cada corrida del generador, la opción
+# elegida, los intercambios manuales y la confirmación final. Alimenta el ajuste del generador
+# y el análisis de equidad.
+# Las filas se encolan en memoria y un escritor por lotes las vuelca con un solo executemany:
+# cuando se llena el lote, cada INTERVALO segundos (hilo daemon) y al salir del proceso (atexit).
+# La UI nunca espera a la base.
+
+import atexit
+import hashlib
+import json
+import threading
+import uuid
+from datetime import datetime
+from database import get_connection
+
+EVENTOS = ("generacion", "seleccion", "intercambio", "confirmacion")
+
+SQL_INSERT = """
+INSERT INTO generaciones_log (creado, partido_id, corrida, evento, roster_hash, datos)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+class EscritorLotes:
+    """Buffer de filas para un INSERT; se vacía por tamaño, por tiempo o al salir."""
+
+    def __init__(self, sql, tam_lote=50, intervalo=5.0):
+        self.sql = sql
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self._filas = []
+        self._lock = threading.Lock()
+        self._escritura = threading.Lock()  # un solo executemany a la vez
+        self._hilo = None
+        atexit.register(self.vaciar)
+
+    def agregar(self, fila):
+        with self._lock:
+            self._filas.append(fila)
+            lleno = len(self._filas) >= self.tam_lote
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="bitacora", daemon=True)
+                self._hilo.start()
+        if lleno:
+            self.vaciar()
+
+    def vaciar(self):
+        with self._escritura:
+            with self._lock:
+                filas, self._filas = self._filas, []
+            if not filas:
+                return
+            try:
+                with get_connection() as conn:
+                    conn.executemany(self.sql, filas)
+                    conn.commit()
+            except Exception:
+                # No perder el lote: se reintenta en el próximo vaciado
+                with self._lock:
+                    self._filas[:0] = filas
+                raise
+
+    def _bucle(self):
+        evento = threading.Event()
+        while not evento.wait(self.intervalo):
+            try:
+                self.vaciar()
+            except Exception:
+                pass
+
+_escritor = EscritorLotes(SQL_INSERT)
+
+# -------------------------
+# API
+# -------------------------
+def nueva_corrida():
+    return uuid.uuid4().hex
+
+def hash_roster(jugadores, bloques=None):
+    """Huella del input del generador: (id, ELO usado) de cada jugador + bloques de compañeros."""
+    base = sorted((j["jugador_id"], round(float(j["elo"]), 3)) for j in jugadores)
+    bloques_ids = sorted(sorted(j["jugador_id"] for j in b) for b in (bloques or []) if len(b) > 1)
+    return hashlib.sha1(json.dumps([base, bloques_ids]).encode()).hexdigest()
+
+def registrar(evento, partido_id, corrida, roster_hash=None, **datos):
+    if evento not in EVENTOS:
+        raise ValueError(f"Evento desconocido: {evento}")
+    _escritor.agregar((datetime.now().isoformat(), partido_id, corrida, evento, roster_hash,
+                       json.dumps(datos, ensure_ascii=False, default=float)))
+
+def vaciar():
+    _escritor.vaciar()
@@ -0,0 +1,51 @@
+# calendario.py
+# Datos del calendario de historial: todos los días con partido de un año en UNA consulta
+# (rango sobre idx_partidos_anio_mes_dia, ya ordenado por mes/día), con cantidad de partidos
+# y de oficiales.
+# Cacheado por año; se invalida sólo al registrar o deshacer un resultado.
+
+from datetime import date
+import streamlit as st
+from database import get_connection
+
+SQL_DIAS_DEL_ANIO = """
+SELECT p.mes,
+       p.dia,
+       COUNT(*) AS partidos,
+       SUM(p.es_oficial) AS oficiales
+  FROM partidos p
+ WHERE p.anio = ?
+   AND p.fecha_iso <= ?
+   AND (p.ganador IS NOT NULL OR p.diferencia_gol IS NOT NULL)
+   AND EXISTS (SELECT 1 FROM partido_jugadores pj WHERE pj.partido_id = p.id)
+ GROUP BY p.mes, p.dia
+"""
+
+@st.cache_data(show_spinner=False)
+def _dias(anio: int, hoy_iso: str):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_DIAS_DEL_ANIO, (anio, hoy_iso))
+        return {(r[0], r[1]): {"partidos": r[2], "oficiales": r[3] or 0} for r in cur.fetchall()}
+
+def dias_con_partido(anio: int):
+    """{(mes, dia): {"partidos": n, "oficiales": k}} de los días jugados (con resultado) del año."""
+    return _dias(int(anio), date.today().isoformat())
+
+@st.cache_data(show_spinner=False)
+def anios_disponibles():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT DISTINCT anio
+              FROM partidos
+             WHERE anio IS NOT NULL
+               AND (ganador IS NOT NULL OR diferencia_gol IS NOT NULL)
+          ORDER BY anio DESC
+        """)
+        return [str(r[0]) for r in cur.fetchall()]
+
+def invalidar():
+    """Llamar al registrar o deshacer un resultado."""
+    _dias.clear()
+    anios_disponibles.clear()
@@ -2,7 +2,18 @@
 import streamlit as st
 import sqlite3
 from datetime import datetime
+import numpy as np
 import equipos
+import timeline_elo
+import stats
+import ranking
+import quimica
+import forma
+import equidad
+import sinergia
+import calendario
+import decaimiento_elo
+import prediccion
 
 DB_NAME = "elo_futbol.db"
 
@@ -18,6 +29,176 @@ def calcular_elo(elo_a, elo_b, score_a, score_b, K):
     new_b = elo_b + K * (score_b - exp_b)
     return round(new_a), round(new_b)
 
+# Modos de actualización de ELO para partidos oficiales
+MODO_EQUIPO = "equipo"          # delta común por equipo (promedio vs promedio)
+MODO_INDIVIDUAL = "individual"  # expectativa de cada jugador vs fuerza rival
+
+# Partidos oficiales a partir de los cuales un jugador deja de considerarse "nuevo"
+# (la incertidumbre decae como N / (N + jugados))
+PARTIDOS_INCERTIDUMBRE = 10
+# Extra de K por incertidumbre máxima: K_i = K * (1 + INCERTIDUMBRE_K_EXTRA * incertidumbre_i),
+# es decir, como mucho 1.5 × K para un jugador nuevo o que vuelve tras un año sin jugar
+INCERTIDUMBRE_K_EXTRA = 0.5
+
+def factor_k(dif_goles):
+    """Multiplicador de K según la diferencia de gol."""
+    if dif_goles >= 6:
+        return 1.8
+    if dif_goles >= 3:
+        return 1.3
+    return 1.0
+
+def _scores(ganador):
+    """(score equipo 1, score equipo 2) según ganador (None/0 = empate)."""
+    if ganador == 1:
+        return 1.0, 0.0
+    if ganador == 2:
+        return 0.0, 1.0
+    return 0.5, 0.5
+
+def calcular_deltas_individuales(elos, equipos_vec, ganador, K, incertidumbre=None):
+    """
+    Deltas por jugador (vectorizado, cualquier tamaño de equipo).
+    - La expectativa de cada jugador se calcula contra el ELO promedio del equipo rival.
+    - `incertidumbre` (0..1 por jugador) escala K: K_i = K * (1 + INCERTIDUMBRE_K_EXTRA * incertidumbre_i).
+    Devuelve np.ndarray de deltas en el mismo orden que `elos`.
+    """
+    elos = np.asarray(elos, dtype=float)
+    eq = np.asarray(equipos_vec)
+    en1 = eq == 1
+    en2 = eq == 2
+    if not en1.any() or not en2.any():
+        raise ValueError("Ambos equipos deben tener al menos un jugador.")
+
+    rival = np.where(en1, elos[en2].mean(), elos[en1].mean())
+    esperado = 1.0 / (1.0 + 10 ** ((rival - elos) / 400.0))
+    s1, s2 = _scores(ganador)
+    score = np.where(en1, s1, s2)
+
+    k = np.full(elos.shape, float(K))
+    if incertidumbre is not None:
+        k = k * (1.0 + INCERTIDUMBRE_K_EXTRA * np.clip(np.asarray(incertidumbre, dtype=float), 0.0, 1.0))
+    return k * (score - esperado)
+
+def _incertidumbres(cur, partido_id, jugador_ids):
+    """
+    Incertidumbre 0..1 por jugador al momento del partido: pocos oficiales previos o mucho tiempo
+    sin jugar entre su oficial anterior y la fecha del partido (no "hoy": un partido cargado tarde
+    no debe verse como inactividad). Rango por PK de elo_timeline (jugador_id, fecha, partido_id).
+    """
+    if not jugador_ids:
+        return np.zeros(0)
+    cur.execute("SELECT fecha_iso FROM partidos WHERE id = ?", (partido_id,))
+    fecha = cur.fetchone()[0]
+    marcas = ",".join("?" * len(jugador_ids))
+    cur.execute(f"""
+        SELECT jugador_id, COUNT(*) AS n, MAX(fecha) AS anterior
+          FROM elo_timeline
+         WHERE jugador_id IN ({marcas})
+           AND (fecha < ? OR (fecha = ? AND partido_id < ?))
+      GROUP BY jugador_id
+    """, (*jugador_ids, fecha, fecha, partido_id))
+    previos = {r[0]: (r[1], r[2]) for r in cur.fetchall()}
+
+    n = np.array([previos.get(j, (0, None))[0] for j in jugador_ids], dtype=float)
+    por_partidos = PARTIDOS_INCERTIDUMBRE / (PARTIDOS_INCERTIDUMBRE + n)
+    # La inactividad prolongada también vuelve incierto el rating (sin oficial previo: sólo cuenta N)
+    dia = datetime.fromisoformat(fecha).date()
+    dias = np.array([(dia - datetime.fromisoformat(previos[j][1]).date()).days if j in previos else 0
+                     for j in jugador_ids], dtype=float)
+    por_inactividad = decaimiento_elo.incertidumbre_por_inactividad(dias)
+    return np.maximum(por_partidos, por_inactividad)
+
+def calcular_deltas(jugadores, ganador, dif_goles, K_base, modo=MODO_EQUIPO, incertidumbre=None):
+    """
+    Deltas de ELO para los jugadores de un partido (lista de dicts con 'elo' y 'equipo').
+    - MODO_EQUIPO: promedio de cada equipo (sobre su tamaño real) y mismo delta para todos.
+    - MODO_INDIVIDUAL: ver calcular_deltas_individuales.
+    """
+    K = int(K_base * factor_k(dif_goles))
+    elos = np.array([j["elo"] for j in jugadores], dtype=float)
+    eq = np.array([j["equipo"] for j in jugadores])
+
+    if modo == MODO_INDIVIDUAL:
+        return calcular_deltas_individuales(elos, eq, ganador, K, incertidumbre)
+
+    elo1 = elos[eq == 1].mean()
+    elo2 = elos[eq == 2].mean()
+    s1, s2 = _scores(ganador)
+    new1, new2 = calcular_elo(elo1, elo2, s1, s2, K)
+    return np.where(eq == 1, new1 - elo1, new2 - elo2)
+
+def registrar_resultado(partido_id: int, ganador, dif_goles: int, oficial: bool,
+                        K_base: int = 80, modo: str = MODO_EQUIPO, ponderar_incertidumbre: bool = False):
+    """
+    Guarda el resultado, cierra el partido y (si es oficial) actualiza ELO + historial_elo.
+    Todo en una sola transacción. Devuelve los refrescos de caché que fallaron después del commit
+    (el resultado ya quedó guardado).
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE partidos
+               SET ganador = ?, diferencia_gol = ?, es_oficial = ?, tipo = 'cerrado'
+             WHERE id = ?
+        """, (ganador, dif_goles, 1 if oficial else 0, partido_id))
+
+        if oficial:
+            jugadores = [j for j in equipos.obtener_jugadores_partido_full(partido_id) if j["equipo"] in (1, 2)]
+            incertidumbre = None
+            if modo == MODO_INDIVIDUAL and ponderar_incertidumbre:
+                incertidumbre = _incertidumbres(cur, partido_id, [j["jugador_id"] for j in jugadores])
+            deltas = calcular_deltas(jugadores, ganador, dif_goles, K_base, modo, incertidumbre)
+
+            ahora = datetime.now().isoformat()
+            cambios = [(j["jugador_id"], j["elo"], j["elo"] + float(delta))
+                       for j, delta in zip(jugadores, deltas)]
+            cur.executemany("UPDATE jugadores SET elo_actual = ? WHERE id = ?",
+                            [(post, jid) for jid, _, post in cambios])
+            cur.executemany("""
+                INSERT INTO historial_elo (jugador_id, partido_id, elo_antes, elo_despues, fecha)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(jid, partido_id, pre, post, ahora) for jid, pre, post in cambios])
+            timeline_elo.agregar_partido(cur, partido_id)
+            forma.agregar_partido(cur, partido_id)
+
+        stats.aplicar_resultado(cur, partido_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    pasos = [("decaimiento", decaimiento_elo.invalidar),
+             ("química", lambda: quimica.agregar_partido(partido_id)),
+             ("equidad", lambda: equidad.agregar_partido(partido_id)),
+             ("calendario", calendario.invalidar)]
+    if oficial:
+        pasos += [("ranking", lambda: ranking.actualizar([(jid, post) for jid, _, post in cambios])),
+                  ("predicción", lambda: prediccion.actualizar_con_partido(partido_id)),
+                  ("sinergia", sinergia.invalidar)]
+    return _refrescar(pasos)
+
+def _refrescar(pasos):
+    """Corre los refrescos post-commit por separado; devuelve ["nombre: error"] de los que fallaron."""
+    fallidos = []
+    for nombre, paso in pasos:
+        try:
+            paso()
+        except Exception as e:
+            fallidos.append(f"{nombre}: {e}")
+    return fallidos
+
+def _flash_guardado(msg, tipo, fallidos):
+    """Mensaje de éxito; si algún refresco falló, aviso aparte (el cambio ya está en la base)."""
+    if fallidos:
+        msg += (" Pero no se pudieron refrescar algunos cálculos (" + "; ".join(fallidos) +
+                "); reiniciá la app si ves datos desactualizados.")
+        tipo = "warning"
+    st.session_state["_flash_msg"] = msg
+    st.session_state["_flash_type"] = tipo
+
 def _flash_show_and_clear():
     msg = st.session_state.pop("_flash_msg", None)
     typ = st.session_state.pop("_flash_type", "info") if msg else None
@@ -33,37 +214,30 @@ def _flash_show_and_clear():
 
 def _get_partidos_listos():
     """
-    Partidos listos para registrar:
+    Partidos listos para registrar (una sola consulta sobre v_partidos_estado):
     - tipo = 'abierto'
     - equipos confirmados (10 jugadores asignados a equipo 1/2)
     - camisetas asignadas y uniformes por equipo
     - SIN resultado (ganador y diferencia_gol NULL)
+    Devuelve lista de (id, etiqueta, camiseta1, camiseta2).
     """
     conn = get_connection()
     cur = conn.cursor()
     cur.execute("""
-        SELECT DISTINCT p.id, p.fecha, IFNULL(c.nombre,'Sin asignar') AS cancha,
-               p.ganador, p.diferencia_gol
-          FROM partidos p
-          JOIN partido_jugadores pj ON pj.partido_id = p.id
-     LEFT JOIN canchas c ON c.id = p.cancha_id
-         WHERE p.tipo = 'abierto'
-      ORDER BY p.fecha DESC, p.id DESC
+        SELECT id, fecha, cancha, camiseta1, camiseta2
+          FROM v_partidos_estado
+         WHERE tipo = 'abierto'
+           AND n_equipo1 + n_equipo2 = 10
+           AND camiseta1 IS NOT NULL
+           AND camiseta2 IS NOT NULL
+           AND NOT tiene_resultado
+      ORDER BY fecha DESC, id DESC
     """)
     rows = cur.fetchall()
     conn.close()
 
-    opciones = []
-    for p in rows:
-        # confirmados + camisetas
-        conf, _, _, _, _ = equipos.equipos_ya_confirmados(p["id"])
-        cam1 = equipos.obtener_camiseta_equipo(p["id"], 1)
-        cam2 = equipos.obtener_camiseta_equipo(p["id"], 2)
-        sin_resultado = (p["ganador"] is None) and (p["diferencia_gol"] is None)
-        if conf and cam1 and cam2 and sin_resultado:
-            etiqueta = f"ID {p['id']} - {p['fecha']} - {p['cancha']}"
-            opciones.append((p["id"], etiqueta))
-    return opciones
+    return [(p["id"], f"ID {p['id']} - {p['fecha']} - {p['cancha']}", p["camiseta1"], p["camiseta2"])
+            for p in rows]
 
 def _ultimo_partido_con_resultado():
     """Devuelve (id, es_oficial) del último partido con resultado (o None)."""
@@ -89,34 +263,52 @@ def _deshacer_partido(partido_id: int):
     - limpia ganador/diferencia_gol
     - deja es_oficial = 0 (por NOT NULL)
     - reabre el partido: tipo = 'abierto'
+    Todo en una sola transacción; devuelve los refrescos de caché que fallaron después del commit.
     """
     conn = get_connection()
     cur = conn.cursor()
-
-    cur.execute("SELECT es_oficial FROM partidos WHERE id = ?", (partido_id,))
-    row = cur.fetchone()
-    if not row:
+    try:
+        cur.execute("SELECT es_oficial FROM partidos WHERE id = ?", (partido_id,))
+        row = cur.fetchone()
+        if not row:
+            raise RuntimeError("Partido inexistente.")
+        es_oficial = row["es_oficial"]
+
+        stats.revertir_resultado(cur, partido_id)
+        if es_oficial == 1:
+            cur.execute("SELECT jugador_id, elo_antes FROM historial_elo WHERE partido_id = ?", (partido_id,))
+            afectados = []
+            for r in cur.fetchall():
+                cur.execute("UPDATE jugadores SET elo_actual = ? WHERE id = ?", (r["elo_antes"], r["jugador_id"]))
+                afectados.append(r["jugador_id"])
+            cur.execute("DELETE FROM historial_elo WHERE partido_id = ?", (partido_id,))
+            timeline_elo.quitar_partido(cur, partido_id)
+            forma.reconstruir_jugadores(cur, afectados)
+
+        cur.execute("""
+            UPDATE partidos
+               SET ganador = NULL,
+                   diferencia_gol = NULL,
+                   es_oficial = 0
+             WHERE id = ?
+        """, (partido_id,))
+        # Re-abrir para que vuelva a aparecer en las pantallas previas
+        cur.execute("UPDATE partidos SET tipo = 'abierto' WHERE id = ?", (partido_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         conn.close()
-        raise RuntimeError("Partido inexistente.")
-    es_oficial = row["es_oficial"]
-
+    pasos = [("decaimiento", decaimiento_elo.invalidar),
+             ("química", quimica.invalidar),
+             ("equidad", equidad.invalidar),
+             ("calendario", calendario.invalidar)]
     if es_oficial == 1:
-        cur.execute("SELECT jugador_id, elo_antes FROM historial_elo WHERE partido_id = ?", (partido_id,))
-        for r in cur.fetchall():
-            cur.execute("UPDATE jugadores SET elo_actual = ? WHERE id = ?", (r["elo_antes"], r["jugador_id"]))
-        cur.execute("DELETE FROM historial_elo WHERE partido_id = ?", (partido_id,))
-
-    cur.execute("""
-        UPDATE partidos
-           SET ganador = NULL,
-               diferencia_gol = NULL,
-               es_oficial = 0
-         WHERE id = ?
-    """, (partido_id,))
-    # Re-abrir para que vuelva a aparecer en las pantallas previas
-    cur.execute("UPDATE partidos SET tipo = 'abierto' WHERE id = ?", (partido_id,))
-    conn.commit()
-    conn.close()
+        pasos += [("ranking", ranking.invalidar),
+                  ("predicción", prediccion.invalidar),
+                  ("sinergia", sinergia.invalidar)]
+    return _refrescar(pasos)
 
 def panel_resultados():
     st.subheader("📊 Registrar resultado")
@@ -129,12 +321,10 @@ def panel_resultados():
 
     if opciones:
         partido_sel = st.selectbox("Selecciona un partido", [o[1] for o in opciones], key="sb_partido_listo")
-        partido_id = next(pid for pid, label in opciones if label == partido_sel)
+        partido_id, _, cam1, cam2 = next(o for o in opciones if o[1] == partido_sel)
 
         # Vista de equipos + colores a nivel de equipo
         st.markdown("### Equipos confirmados")
-        cam1 = equipos.obtener_camiseta_equipo(partido_id, 1) or "—"
-        cam2 = equipos.obtener_camiseta_equipo(partido_id, 2) or "—"
         equipos.render_vista_jugadores(partido_id)
 
         st.divider()
@@ -149,70 +339,33 @@ def panel_resultados():
         )
         dif_goles = st.number_input("Diferencia de goles", min_value=0, step=1, key="ni_dif_goles")
         oficial = st.radio("Tipo de partido", ["Oficial", "Amistoso"], key="rb_oficial")
+        modo_elo = st.radio(
+            "Actualización de ELO",
+            ["Promedio de equipo (mismo delta)", "Individual (expectativa por jugador)"],
+            key="rb_modo_elo"
+        )
+        ponderar = False
+        if modo_elo.startswith("Individual"):
+            ponderar = st.checkbox("Ponderar por incertidumbre (jugadores con pocos partidos se mueven más)",
+                                   value=True, key="cb_ponderar_incertidumbre")
 
         if st.button("✅ Registrar resultado", key="btn_registrar_resultado"):
             try:
-                conn = get_connection()
-                cur = conn.cursor()
-
                 ganador = None
                 if "Equipo 1" in resultado:
                     ganador = 1
                 elif "Equipo 2" in resultado:
                     ganador = 2
 
-                # Guardar resultado (oficial/amistoso)
-                cur.execute("""
-                    UPDATE partidos
-                       SET ganador = ?, diferencia_gol = ?, es_oficial = ?
-                     WHERE id = ?
-                """, (ganador, dif_goles, 1 if oficial == "Oficial" else 0, partido_id))
-                conn.commit()
-
-                # Cerrar el partido para desaparecer de crear/generar
-                cur.execute("UPDATE partidos SET tipo = 'cerrado' WHERE id = ?", (partido_id,))
-                conn.commit()
-
-                # Si oficial, actualizar ELO + historial_elo (sin usar delta)
-                if oficial == "Oficial":
-                    jugadores = equipos.obtener_jugadores_partido_full(partido_id)
-                    elo1 = sum(j["elo"] for j in jugadores if j["equipo"] == 1) / 5
-                    elo2 = sum(j["elo"] for j in jugadores if j["equipo"] == 2) / 5
-                    score1 = score2 = 0.5
-                    if ganador == 1: score1, score2 = 1, 0
-                    elif ganador == 2: score1, score2 = 0, 1
-
-                    # K con multiplicador por diferencia
-                    K_base = st.session_state.get("K_val", 80)
-                    factor = 1.0
-                    if dif_goles >= 6:
-                        factor = 1.8
-                    elif dif_goles >= 3:
-                        factor = 1.3
-                    K = int(K_base * factor)
-
-                    new1, new2 = calcular_elo(elo1, elo2, score1, score2, K)
-                    diff1, diff2 = new1 - elo1, new2 - elo2
-
-                    for j in jugadores:
-                        elo_pre = j["elo"]
-                        delta = diff1 if j["equipo"] == 1 else diff2
-                        elo_post = elo_pre + delta
-                        cur.execute("UPDATE jugadores SET elo_actual = ? WHERE id = ?",
-                                    (elo_post, j["jugador_id"]))
-                        cur.execute("""
-                            INSERT INTO historial_elo (jugador_id, partido_id, elo_antes, elo_despues, fecha)
-                            VALUES (?, ?, ?, ?, ?)
-                        """, (j["jugador_id"], partido_id,
-                              elo_pre, elo_post,
-                              datetime.now().isoformat()))
-                    conn.commit()
-
-                conn.close()
+                fallidos = registrar_resultado(
+                    partido_id, ganador, dif_goles, oficial == "Oficial",
+                    K_base=st.session_state.get("K_val", 80),
+                    modo=MODO_INDIVIDUAL if modo_elo.startswith("Individual") else MODO_EQUIPO,
+                    ponderar_incertidumbre=ponderar,
+                )
 
                 st.session_state["_last_registered_id"] = partido_id
-                st.session_state["_flash_msg"] = f"Resultado del partido {partido_id} registrado y partido cerrado."
-                st.session_state["_flash_type"] = "success"
+                _flash_guardado(f"Resultado del partido {partido_id} registrado y partido cerrado.", "success", fallidos)
                 st.rerun()
 
             except Exception as e:
@@ -235,9 +388,8 @@ def panel_resultados():
         with col_a:
             if st.button(f"Deshacer resultado de ID {ultimo_id}", key="btn_deshacer_ultimo_sesion"):
                 try:
-                    _deshacer_partido(ultimo_id)
-                    st.session_state["_flash_msg"] = f"Se deshizo el resultado del partido {ultimo_id} (reabierto)."
-                    st.session_state["_flash_type"] = "warning"
+                    fallidos = _deshacer_partido(ultimo_id)
+                    _flash_guardado(f"Se deshizo el resultado del partido {ultimo_id} (reabierto).", "warning", fallidos)
                     st.session_state.pop("_last_registered_id", None)
                     st.rerun()
                 except Exception as e:
@@ -257,9 +409,8 @@ def panel_resultados():
             st.caption(f"Último partido con resultado en base de datos: ID {ult_id}")
             if st.button(f"Deshacer resultado de ID {ult_id}", key="btn_deshacer_ultimo_db"):
                 try:
-                    _deshacer_partido(ult_id)
-                    st.session_state["_flash_msg"] = f"Se deshizo el resultado del partido {ult_id} (reabierto)."
-                    st.session_state["_flash_type"] = "warning"
+                    fallidos = _deshacer_partido(ult_id)
+                    _flash_guardado(f"Se deshizo el resultado del partido {ult_id} (reabierto).", "warning", fallidos)
                     st.rerun()
                 except Exception as e:
                     st.session_state["_flash_msg"] = f"Error al deshacer (último en DB): {e}"
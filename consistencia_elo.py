@@ -0,0 +1,198 @@
+# consistencia_elo.py
+# Verificador de invariantes del ELO (consultas set-based, sin recorrer jugador por jugador):
+#   1. jugadores.elo_actual == último historial_elo.elo_despues del jugador
+#   2. cada partido oficial con resultado tiene exactamente una fila de historial por participante
+#   3. la cadena de cada jugador es continua: elo_antes == elo_despues de su fila anterior
+# Uso:
+#   python consistencia_elo.py            -> reporte
+#   python consistencia_elo.py --reparar  -> reporte + reparación atómica
+
+import sys
+from database import get_connection
+import timeline_elo
+import decaimiento_elo
+import ranking
+import forma
+import stats
+import prediccion
+import equidad
+import sinergia
+
+TOLERANCIA = 1e-6
+
+# Sólo cuentan filas de historial de partidos oficiales existentes (las huérfanas no fijan elo_actual)
+SQL_HISTORIAL_VALIDO = """
+SELECT he.* FROM historial_elo he
+  JOIN partidos p ON p.id = he.partido_id
+ WHERE p.es_oficial = 1
+"""
+
+SQL_ELO_ACTUAL = f"""
+SELECT j.id AS jugador_id, j.nombre, j.elo_actual, he.elo_despues AS elo_esperado
+  FROM jugadores j
+  JOIN (SELECT jugador_id, MAX(id) AS ultimo_id FROM ({SQL_HISTORIAL_VALIDO}) GROUP BY jugador_id) u
+    ON u.jugador_id = j.id
+  JOIN historial_elo he ON he.id = u.ultimo_id
+ WHERE ABS(j.elo_actual - he.elo_despues) > ?
+ ORDER BY j.id
+"""
+
+SQL_FALTANTES = """
+SELECT p.id AS partido_id, pj.jugador_id
+  FROM partidos p
+  JOIN partido_jugadores pj ON pj.partido_id = p.id AND pj.equipo IN (1, 2)
+ WHERE p.es_oficial = 1
+   AND (p.ganador IS NOT NULL OR p.diferencia_gol IS NOT NULL)
+   AND NOT EXISTS (SELECT 1 FROM historial_elo he
+                    WHERE he.partido_id = p.id AND he.jugador_id = pj.jugador_id)
+ ORDER BY p.id, pj.jugador_id
+"""
+
+SQL_DUPLICADAS = """
+SELECT partido_id, jugador_id, COUNT(*) AS filas, MAX(id) AS conservar_id
+  FROM historial_elo
+ GROUP BY partido_id, jugador_id
+HAVING COUNT(*) > 1
+ ORDER BY partido_id, jugador_id
+"""
+
+SQL_HUERFANAS = """
+SELECT he.id AS historial_id, he.partido_id, he.jugador_id,
+       CASE WHEN p.id IS NULL THEN 'partido inexistente'
+            WHEN p.es_oficial = 0 OR (p.ganador IS NULL AND p.diferencia_gol IS NULL)
+                 THEN 'partido no oficial o sin resultado'
+            ELSE 'jugador no participó' END AS motivo
+  FROM historial_elo he
+  LEFT JOIN partidos p ON p.id = he.partido_id
+ WHERE p.id IS NULL
+    OR p.es_oficial = 0
+    OR (p.ganador IS NULL AND p.diferencia_gol IS NULL)
+    OR NOT EXISTS (SELECT 1 FROM partido_jugadores pj
+                    WHERE pj.partido_id = he.partido_id AND pj.jugador_id = he.jugador_id)
+ ORDER BY he.id
+"""
+
+SQL_CADENA = """
+SELECT historial_id, jugador_id, partido_id, elo_antes, elo_previo
+  FROM (SELECT id AS historial_id, jugador_id, partido_id, elo_antes,
+               LAG(elo_despues) OVER (PARTITION BY jugador_id ORDER BY id) AS elo_previo
+          FROM historial_elo)
+ WHERE elo_previo IS NOT NULL AND ABS(elo_antes - elo_previo) > ?
+ ORDER BY jugador_id, historial_id
+"""
+
+def _dicts(cur):
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, tuple(r))) for r in cur.fetchall()]
+
+def verificar(conn=None):
+    """
+    Devuelve dict {invariante: [filas con diferencia]}.
+    Claves: elo_actual, faltantes, duplicadas, huerfanas, cadena.
+    """
+    propia = conn is None
+    conn = conn or get_connection()
+    try:
+        cur = conn.cursor()
+        reporte = {}
+        cur.execute(SQL_ELO_ACTUAL, (TOLERANCIA,))
+        reporte["elo_actual"] = _dicts(cur)
+        cur.execute(SQL_FALTANTES)
+        reporte["faltantes"] = _dicts(cur)
+        cur.execute(SQL_DUPLICADAS)
+        reporte["duplicadas"] = _dicts(cur)
+        cur.execute(SQL_HUERFANAS)
+        reporte["huerfanas"] = _dicts(cur)
+        cur.execute(SQL_CADENA, (TOLERANCIA,))
+        reporte["cadena"] = _dicts(cur)
+        return reporte
+    finally:
+        if propia:
+            conn.close()
+
+def es_consistente(reporte) -> bool:
+    return not any(reporte.values())
+
+def reparar():
+    """
+    Reparación atómica (todo o nada):
+    - colapsa duplicados (partido, jugador) en una sola fila neta: conserva la última
+      (elo_despues final) con el elo_antes de la primera, así la cadena no se corta
+    - borra las filas huérfanas (partido inexistente, no oficial o sin resultado, o jugador que
+      no participó)
+    - alinea jugadores.elo_actual con el último elo_despues de un partido oficial
+    - regenera la línea de tiempo materializada y los derivados de historial_elo
+      (buffers de forma, jugador_stats) e invalida los caches en memoria (ranking, decaimiento,
+      modelo de predicción, equidad, sinergia)
+    Filas faltantes y cortes de cadena NO se reparan solos (requieren decidir o recalcular
+    resultados); quedan en el reporte que se devuelve.
+    Los caches en memoria que se invalidan son los de ESTE proceso: si se repara desde la línea
+    de comandos con la app corriendo, hay que reiniciar la app.
+    """
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("""
+            UPDATE historial_elo
+               SET elo_antes = (SELECT h.elo_antes FROM historial_elo h
+                                 WHERE h.partido_id = historial_elo.partido_id
+                                   AND h.jugador_id = historial_elo.jugador_id
+                              ORDER BY h.id ASC LIMIT 1)
+             WHERE id IN (SELECT MAX(id) FROM historial_elo
+                           GROUP BY partido_id, jugador_id HAVING COUNT(*) > 1)
+        """)
+        cur.execute("""
+            DELETE FROM historial_elo
+             WHERE id NOT IN (SELECT MAX(id) FROM historial_elo GROUP BY partido_id, jugador_id)
+        """)
+        cur.execute("DELETE FROM historial_elo WHERE id IN (SELECT historial_id FROM (%s))"
+                    % SQL_HUERFANAS.replace("ORDER BY he.id", ""))
+        cur.execute(f"""
+            UPDATE jugadores
+               SET elo_actual = (SELECT he.elo_despues FROM ({SQL_HISTORIAL_VALIDO}) he
+                                  WHERE he.jugador_id = jugadores.id
+                               ORDER BY he.id DESC LIMIT 1)
+             WHERE id IN (SELECT jugador_id FROM ({SQL_HISTORIAL_VALIDO}))
+        """)
+        timeline_elo.reconstruir(cur)
+        forma.reconstruir_jugadores(cur)
+        stats.reconstruir_jugador_stats(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    decaimiento_elo.invalidar()
+    ranking.invalidar()
+    prediccion.invalidar()
+    equidad.invalidar()
+    sinergia.invalidar()
+    return verificar()
+
+TITULOS = {
+    "elo_actual": "elo_actual distinto del último elo_despues",
+    "faltantes": "participantes de oficiales sin fila de historial",
+    "duplicadas": "filas de historial duplicadas (partido, jugador)",
+    "huerfanas": "filas de historial sin partido oficial/participación",
+    "cadena": "cortes de cadena (elo_antes != elo_despues previo)",
+}
+
+def _imprimir(reporte):
+    for clave, filas in reporte.items():
+        print(f"[{'OK' if not filas else len(filas)}] {TITULOS[clave]}")
+        for f in filas[:20]:
+            print("    ", f)
+        if len(filas) > 20:
+            print(f"     ... {len(filas) - 20} más")
+
+if __name__ == "__main__":
+    rep = verificar()
+    _imprimir(rep)
+    if "--reparar" in sys.argv:
+        print("\nReparando...")
+        _imprimir(reparar())
+        print("\nAtención: si la app está corriendo, reiniciala. Sus caches en memoria (ranking, "
+              "forma, sinergia, modelo de predicción, ELO efectivo) no se enteran de esta reparación.")
+    sys.exit(0 if es_consistente(rep) else 1)
@@ -0,0 +1,81 @@
+# decaimiento_elo.py
+# Decaimiento "perezoso" del ELO para jugadores inactivos.
+# No reescribe jugadores.elo_actual: el ELO efectivo se calcula al leer, a partir de la
+# fecha del último oficial y se cachea por día. Esa fecha sale de un MAX(fecha) correlacionado por
+# jugador, que SQLite resuelve con una sola búsqueda en la PK (jugador_id, fecha, partido_id) de
+# elo_timeline: costo por jugador, no por tamaño del historial.
+
+from datetime import date
+import numpy as np
+import streamlit as st
+from database import get_connection
+
+# -------------------------
+# Configuración
+# -------------------------
+DIAS_GRACIA = 60          # sin decaimiento durante los primeros N días sin jugar
+VIDA_MEDIA_DIAS = 180     # pasada la gracia, la distancia a la media se reduce a la mitad cada N días
+DIAS_INCERTIDUMBRE = 365  # inactividad a partir de la cual la incertidumbre es máxima (1.0)
+ELO_MEDIA = None          # None = media de los jugadores activos
+
+def _factores(dias_inactivo):
+    """(factor de retención de la distancia a la media, incertidumbre 0..1) vectorizados."""
+    dias = np.asarray(dias_inactivo, dtype=float)
+    exceso = np.clip(dias - DIAS_GRACIA, 0.0, None)
+    retencion = 0.5 ** (exceso / VIDA_MEDIA_DIAS)
+    incertidumbre = np.clip(dias / DIAS_INCERTIDUMBRE, 0.0, 1.0)
+    return retencion, incertidumbre
+
+def incertidumbre_por_inactividad(dias_inactivo):
+    """Incertidumbre 0..1 por días sin jugar (vectorizada), la misma que usa el ELO efectivo."""
+    return _factores(dias_inactivo)[1]
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def _efectivos_del_dia(dia_iso: str):
+    """{jugador_id: (elo_efectivo, incertidumbre, ultimo_partido)} para el día dado (una consulta)."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT j.id, j.elo_actual, j.estado,
+                   (SELECT MAX(t.fecha) FROM elo_timeline t WHERE t.jugador_id = j.id) AS ultimo
+              FROM jugadores j
+        """)
+        rows = [tuple(r) for r in cur.fetchall()]
+    if not rows:
+        return {}
+
+    ids = [r[0] for r in rows]
+    elos = np.array([r[1] if r[1] is not None else 1000.0 for r in rows], dtype=float)
+    activos = np.array([r[2] == "activo" for r in rows])
+    media = ELO_MEDIA if ELO_MEDIA is not None else float(elos[activos].mean() if activos.any() else elos.mean())
+
+    hoy = date.fromisoformat(dia_iso)
+    # Sin oficiales todavía: no se decae (ELO inicial cargado por el admin)
+    dias = np.array([(hoy - date.fromisoformat(r[3][:10])).days if r[3] else 0 for r in rows], dtype=float)
+    retencion, incertidumbre = _factores(dias)
+    efectivos = media + (elos - media) * retencion
+
+    return {jid: (float(e), float(u), r[3]) for jid, e, u, r in zip(ids, efectivos, incertidumbre, rows)}
+
+def elos_efectivos():
+    """ELO efectivo de todos los jugadores para hoy (cacheado por día)."""
+    return _efectivos_del_dia(date.today().isoformat())
+
+def aplicar(jugadores):
+    """
+    Reemplaza j["elo"] por el ELO efectivo en una lista de dicts con 'jugador_id' y 'elo'.
+    Conserva el valor guardado en j["elo_guardado"] y agrega j["incertidumbre"].
+    """
+    efectivos = elos_efectivos()
+    for j in jugadores:
+        j["elo_guardado"] = j["elo"]
+        ef = efectivos.get(j["jugador_id"])
+        if ef is not None:
+            j["elo"], j["incertidumbre"] = ef[0], ef[1]
+        else:
+            j["incertidumbre"] = 0.0
+    return jugadores
+
+def invalidar():
+    """Llamar cuando cambia un ELO o una fecha de último partido (resultado, undo, edición)."""
+    _efectivos_del_dia.clear()
@@ -0,0 +1,184 @@
+# equidad.py
+# ¿Los equipos balanceados produjeron partidos parejos?
+# Al confirmar equipos (equipos.guardar_opcion) se guarda en `partido_balance` la brecha de ELO
+# y la probabilidad predicha de la opción elegida. Para partidos anteriores se usa el ELO previo
+# de historial_elo para la brecha; la calibración y el Brier sólo cuentan partidos con probabilidad
+# guardada antes de jugarse (predecirlos con el modelo actual, ajustado sobre ellos mismos, los
+# haría ver mejor de lo que son). El análisis es vectorizado y se resume en agregados acumulativos (sumas por
+# bucket + sumas para correlación y Brier): registrar un resultado suma un partido en O(1);
+# deshacer invalida y se rearma en el próximo uso con una sola consulta.
+
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from database import get_connection
+import prediccion
+
+BORDES_PROB = np.linspace(0.0, 1.0, 11)                          # calibración de P(gana E1)
+BORDES_GAP = np.array([0.0, 25.0, 50.0, 100.0, 200.0, np.inf])   # |ELO1 - ELO2| (promedios)
+DIF_PAREJO = 2                                                   # partido "parejo": dif. de gol <= 2
+
+SQL_PARTIDOS = """
+SELECT p.id AS partido_id,
+       COALESCE(p.ganador, 0) AS ganador,
+       COALESCE(p.diferencia_gol, 0) AS diferencia_gol,
+       COALESCE(pb.elo1, h.elo1) AS elo1,
+       COALESCE(pb.elo2, h.elo2) AS elo2,
+       pb.p1
+  FROM partidos p
+  LEFT JOIN partido_balance pb ON pb.partido_id = p.id
+  LEFT JOIN (SELECT pj.partido_id,
+                    AVG(CASE WHEN pj.equipo = 1 THEN he.elo_antes END) AS elo1,
+                    AVG(CASE WHEN pj.equipo = 2 THEN he.elo_antes END) AS elo2
+               FROM partido_jugadores pj
+               JOIN historial_elo he ON he.partido_id = pj.partido_id AND he.jugador_id = pj.jugador_id
+              WHERE pj.equipo IN (1, 2)
+              GROUP BY pj.partido_id) h ON h.partido_id = p.id
+ WHERE (p.ganador IS NOT NULL OR p.diferencia_gol IS NOT NULL)
+   AND COALESCE(pb.elo1, h.elo1) IS NOT NULL
+   AND COALESCE(pb.elo2, h.elo2) IS NOT NULL
+   {filtro}
+"""
+
+_lock = threading.Lock()
+_agregados = None
+
+def _vacios():
+    nb_p, nb_g = len(BORDES_PROB) - 1, len(BORDES_GAP) - 1
+    return {
+        "cal_n": np.zeros(nb_p), "cal_pred": np.zeros(nb_p), "cal_obs": np.zeros(nb_p),
+        "gap_n": np.zeros(nb_g), "gap_dif": np.zeros(nb_g), "gap_parejos": np.zeros(nb_g),
+        "gap_empates": np.zeros(nb_g), "gap_favorito": np.zeros(nb_g),
+        # sumas para la correlación |gap| vs |dif| y el Brier score
+        "n": 0.0, "n_prob": 0.0, "sx": 0.0, "sy": 0.0, "sxx": 0.0, "syy": 0.0, "sxy": 0.0, "brier": 0.0,
+    }
+
+def _cargar(partido_id=None):
+    filtro, params = ("AND p.id = ?", (partido_id,)) if partido_id is not None else ("", ())
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_PARTIDOS.format(filtro=filtro), params)
+        rows = [tuple(r) for r in cur.fetchall()]
+    if not rows:
+        return None
+    arr = np.array([r[:5] for r in rows], dtype=float)
+    # NaN = sin probabilidad guardada (partidos previos al registro): fuera de calibración y Brier
+    p1 = np.array([np.nan if r[5] is None else r[5] for r in rows], dtype=float)
+    return {"ganador": arr[:, 1], "dif": np.abs(arr[:, 2]), "gap": arr[:, 3] - arr[:, 4], "p1": p1}
+
+def _acumular(agg, datos):
+    """Suma un bloque de partidos (arrays) a los agregados."""
+    gano1 = (datos["ganador"] == 1).astype(float)
+    empate = (datos["ganador"] == 0).astype(float)
+    gap_abs = np.abs(datos["gap"])
+    favorito = np.where(datos["gap"] >= 0, datos["ganador"] == 1, datos["ganador"] == 2).astype(float)
+
+    con_p = ~np.isnan(datos["p1"])
+    p1, obs = datos["p1"][con_p], gano1[con_p]
+    bp = np.clip(np.digitize(p1, BORDES_PROB) - 1, 0, len(BORDES_PROB) - 2)
+    np.add.at(agg["cal_n"], bp, 1.0)
+    np.add.at(agg["cal_pred"], bp, p1)
+    np.add.at(agg["cal_obs"], bp, obs)
+
+    bg = np.clip(np.digitize(gap_abs, BORDES_GAP) - 1, 0, len(BORDES_GAP) - 2)
+    np.add.at(agg["gap_n"], bg, 1.0)
+    np.add.at(agg["gap_dif"], bg, datos["dif"])
+    np.add.at(agg["gap_parejos"], bg, (datos["dif"] <= DIF_PAREJO).astype(float))
+    np.add.at(agg["gap_empates"], bg, empate)
+    np.add.at(agg["gap_favorito"], bg, favorito)
+
+    x, y = gap_abs, datos["dif"]
+    agg["n"] += len(x)
+    agg["sx"] += x.sum(); agg["sy"] += y.sum()
+    agg["sxx"] += (x * x).sum(); agg["syy"] += (y * y).sum(); agg["sxy"] += (x * y).sum()
+    agg["n_prob"] += len(p1)
+    agg["brier"] += ((p1 - obs) ** 2).sum()
+
+def _actuales():
+    """Agregados vigentes (se arman la primera vez). Llamar con _lock tomado."""
+    global _agregados
+    if _agregados is None:
+        agg = _vacios()
+        datos = _cargar()
+        if datos is not None:
+            _acumular(agg, datos)
+        _agregados = agg
+    return _agregados
+
+# -------------------------
+# Mantenimiento
+# -------------------------
+def registrar_balance(cur, partido_id, elos1, elos2, criterio=None):
+    """Guarda brecha y probabilidades de la opción confirmada (en la transacción de `cur`)."""
+    elo1, elo2 = float(np.mean(elos1)), float(np.mean(elos2))
+    p1, pe, p2 = prediccion.probabilidades_equipos(elos1, elos2)
+    cur.execute("""
+        INSERT OR REPLACE INTO partido_balance (partido_id, elo1, elo2, gap, p1, pe, p2, criterio, confirmado)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (partido_id, elo1, elo2, elo1 - elo2, p1, pe, p2, criterio, datetime.now().isoformat()))
+
+def agregar_partido(partido_id: int):
+    """Suma un resultado recién registrado a los agregados (si ya estaban armados)."""
+    with _lock:
+        if _agregados is None:
+            return
+    datos = _cargar(partido_id)
+    if datos is None:
+        return
+    with _lock:
+        if _agregados is not None:
+            _acumular(_agregados, datos)
+
+def invalidar():
+    global _agregados
+    with _lock:
+        _agregados = None
+
+# -------------------------
+# Reporte
+# -------------------------
+def resumen():
+    """
+    dict con:
+    - n, correlacion (|brecha| vs |dif. de gol|)
+    - n_prob, brier: sólo partidos con probabilidad guardada antes de jugarse
+    - calibracion: DataFrame por bucket de P(gana E1): partidos, predicho, observado
+    - por_brecha: DataFrame por bucket de |brecha|: partidos, dif. media, % parejos, % empates, % favorito
+    """
+    with _lock:
+        agg = {k: (v.copy() if isinstance(v, np.ndarray) else v) for k, v in _actuales().items()}
+
+    n = agg["n"]
+    correlacion = None
+    if n >= 2:
+        cov = agg["sxy"] / n - (agg["sx"] / n) * (agg["sy"] / n)
+        vx = agg["sxx"] / n - (agg["sx"] / n) ** 2
+        vy = agg["syy"] / n - (agg["sy"] / n) ** 2
+        if vx > 0 and vy > 0:
+            correlacion = float(cov / np.sqrt(vx * vy))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        calibracion = pd.DataFrame({
+            "rango": [f"{a:.0%}–{b:.0%}" for a, b in zip(BORDES_PROB[:-1], BORDES_PROB[1:])],
+            "partidos": agg["cal_n"].astype(int),
+            "predicho": agg["cal_pred"] / agg["cal_n"],
+            "observado": agg["cal_obs"] / agg["cal_n"],
+        })
+        por_brecha = pd.DataFrame({
+            "brecha": [f"{a:.0f}–{b:.0f}" if np.isfinite(b) else f"{a:.0f}+"
+                       for a, b in zip(BORDES_GAP[:-1], BORDES_GAP[1:])],
+            "partidos": agg["gap_n"].astype(int),
+            "dif_media": agg["gap_dif"] / agg["gap_n"],
+            "parejos_%": agg["gap_parejos"] / agg["gap_n"] * 100,
+            "empates_%": agg["gap_empates"] / agg["gap_n"] * 100,
+            "favorito_%": agg["gap_favorito"] / agg["gap_n"] * 100,
+        })
+    return {
+        "n": int(n),
+        "correlacion": correlacion,
+        "n_prob": int(agg["n_prob"]),
+        "brier": float(agg["brier"] / agg["n_prob"]) if agg["n_prob"] else None,
+        "calibracion": calibracion[calibracion["partidos"] > 0].round(3),
+        "por_brecha": por_brecha[por_brecha["partidos"] > 0].round(2),
+    }
@@ -4,7 +4,15 @@ import sqlite3
 from datetime import datetime
 import unicodedata
 import random
+import itertools
 from collections import defaultdict
+import numpy as np
+import decaimiento_elo
+import prediccion
+import forma
+import equidad
+import bitacora
+import sinergia
 
 DB_NAME = "elo_futbol.db"  # nombre exacto
 
@@ -421,10 +429,80 @@ def generar_opciones_unicas(bloques, n_opciones=3, max_busquedas=180):
 
     return opciones[:n_opciones], diffs[:n_opciones]
 
+# -------------------------
+# Enumeración exhaustiva de particiones (vectorizada)
+# -------------------------
+def particiones_validas(jugadores, tam_equipo=5):
+    """
+    Matriz booleana (P × n): cada fila marca los jugadores del Equipo 1 de una partición
+    válida (tam_equipo jugadores, sin separar duplas/tríos). Con 10 jugadores son ≤ 252 filas.
+    """
+    n = len(jugadores)
+    if n < tam_equipo:
+        return np.zeros((0, n), dtype=bool)
+    combos = np.array(list(itertools.combinations(range(n), tam_equipo)))
+    M = np.zeros((len(combos), n), dtype=bool)
+    M[np.arange(len(combos))[:, None], combos] = True
+
+    grupos = defaultdict(list)
+    for i, j in enumerate(jugadores):
+        if j["bloque"] is not None and j["bloque"] != "":
+            grupos[str(j["bloque"])].append(i)
+    ok = np.ones(len(M), dtype=bool)
+    for idxs in grupos.values():
+        sub = M[:, idxs]
+        ok &= sub.all(axis=1) | ~sub.any(axis=1)
+    return M[ok]
+
+def generar_opciones_por_probabilidad(jugadores, n_opciones=3, tam_equipo=5, con_sinergia=False):
+    """
+    Puntúa TODAS las particiones válidas con el predictor calibrado (una sola pasada
+    vectorizada) y devuelve las n más cercanas a 50/50, en el formato de generar_opciones_unicas.
+    Con con_sinergia, a la fuerza de cada equipo se le suma la sinergia aprendida de sus duplas.
+    Devuelve (opciones, diffs, probs) con probs = [(p1, empate, p2), ...].
+    """
+    M = particiones_validas(jugadores, tam_equipo)
+    if len(M) == 0:
+        return [], [], []
+    elos = np.array([j["elo"] for j in jugadores], dtype=float)
+    nombres = np.array([j["nombre"] for j in jugadores], dtype=object)
+    s1 = M.astype(float) @ elos
+    s2 = elos.sum() - s1
+    f1, f2 = s1 / tam_equipo, s2 / (len(jugadores) - tam_equipo)
+    if con_sinergia:
+        syn1, syn2 = sinergia.sinergia_equipos(M, sinergia.matriz([j["jugador_id"] for j in jugadores]))
+        f1, f2 = f1 + syn1, f2 + syn2
+    p1, pe, p2 = prediccion.probabilidades(f1, f2)
+    orden = np.lexsort((np.abs(s1 - s2), np.abs(p1 - p2)))
+
+    opciones, diffs, probs = [], [], []
+    vistos = set()
+    for k in orden:
+        t1, t2 = list(nombres[M[k]]), list(nombres[~M[k]])
+        clave = frozenset(t1)
+        if clave in vistos:
+            continue
+        vistos.add(clave); vistos.add(frozenset(t2))
+        opciones.append(t1 + t2)
+        diffs.append(float(abs(s1[k] - s2[k])))
+        probs.append((float(p1[k]), float(pe[k]), float(p2[k])))
+        if len(opciones) >= n_opciones:
+            break
+    return opciones, diffs, probs
+
+def _texto_probabilidades(elos1, elos2):
+    p1, pe, p2 = prediccion.probabilidades_equipos(elos1, elos2)
+    return f"P(E1) {p1:.0%} · Empate {pe:.0%} · P(E2) {p2:.0%}"
+
 # -------------------------
 # Guardar / borrar equipos elegidos
 # -------------------------
-def guardar_opcion(partido_id: int, combinacion):
+def guardar_opcion(partido_id: int, combinacion, elo_map=None, criterio=None):
+    """
+    Asigna equipo 1 (primeros 5) / equipo 2 al resto.
+    Con elo_map (nombre -> ELO usado al balancear) registra además brecha y probabilidad
+    de la opción elegida en partido_balance, en la misma transacción.
+    """
     conn = get_connection()
     cur = conn.cursor()
     for idx, nombre in enumerate(combinacion):
@@ -437,6 +515,11 @@ def guardar_opcion(partido_id: int, combinacion):
              WHERE partido_id = ?
                AND jugador_id = (SELECT id FROM jugadores WHERE nombre = ? LIMIT 1)
         """, (equipo_val, partido_id, nombre))
+    if elo_map:
+        equidad.registrar_balance(cur, partido_id,
+                                  [elo_map.get(n, 0) for n in combinacion[:5] if n],
+                                  [elo_map.get(n, 0) for n in combinacion[5:] if n],
+                                  criterio)
     conn.commit()
     conn.close()
 
@@ -644,19 +727,45 @@ def panel_generacion():
     # --- UI para definir compañeros (duplas/tríos) — auto-guardado ---
     ui_definir_bloques(partido_id, names)
 
-    # Reconstruir bloques tras posible guardado
-    jugadores = obtener_jugadores_partido_full(partido_id)
+    # Reconstruir bloques tras posible guardado (con ELO efectivo: decae por inactividad)
+    jugadores = decaimiento_elo.aplicar(obtener_jugadores_partido_full(partido_id))
+    if st.checkbox("Ajustar por forma reciente (ΔELO de los últimos 5 oficiales)", key="cb_ajuste_forma"):
+        jugadores = forma.aplicar(jugadores, ventana=5)
     bloques = construir_bloques(jugadores)
 
+    criterio = st.radio(
+        "Criterio de balance",
+        ["Mínima diferencia de ELO", "Probabilidad 50/50 (modelo calibrado)"],
+        key="rb_criterio_balance", horizontal=True
+    )
+    con_sinergia = False
+    if criterio.startswith("Probabilidad"):
+        con_sinergia = st.checkbox("Sumar sinergia de duplas (aprendida de la historia)", key="cb_sinergia")
+
     # Generar 3 opciones (todas distintas por equipos, forzado a 3)
     if st.button("🎲 Generar 3 opciones balanceadas", key="btn_generar_opciones"):
         with st.spinner("Calculando combinaciones distintas..."):
-            opts, diffs = generar_opciones_unicas(bloques, n_opciones=3, max_busquedas=240)
+            probs = None
+            if criterio.startswith("Probabilidad"):
+                opts, diffs, probs = generar_opciones_por_probabilidad(jugadores, n_opciones=3,
+                                                                       con_sinergia=con_sinergia)
+                # Score con el que se ordenaron las opciones: distancia a 50/50
+                scores = [abs(p1 - p2) for p1, _, p2 in probs]
+            else:
+                opts, diffs = generar_opciones_unicas(bloques, n_opciones=3, max_busquedas=240)
+                scores = [float(d) for d in diffs]
             if not opts or len(opts) < 3:
                 st.warning("Se forzaron opciones alternativas para llegar a 3. Verificá la diversidad.")
             st.session_state._equipos_opciones = opts
             st.session_state._equipos_diffs = diffs
             st.session_state._equipos_actual = None  # limpiar edición manual
+            st.session_state._equipos_corrida = bitacora.nueva_corrida()
+            bitacora.registrar("generacion", partido_id, st.session_state._equipos_corrida,
+                               bitacora.hash_roster(jugadores, bloques),
+                               criterio=criterio, opciones=opts, scores=scores,
+                               diffs_elo=[float(d) for d in diffs], probabilidades=probs,
+                               ajuste_forma=bool(st.session_state.get("cb_ajuste_forma")),
+                               sinergia=con_sinergia)
 
     # Mostrar opciones y permitir elegir
     if "_equipos_opciones" in st.session_state and st.session_state._equipos_opciones:
@@ -676,6 +785,8 @@ def panel_generacion():
             team2 = [n for n in lista[5:] if n]
             elo1 = int(sum(elo_map.get(n, 0) for n in team1))
             elo2 = int(sum(elo_map.get(n, 0) for n in team2))
+            col.caption(_texto_probabilidades([elo_map.get(n, 0) for n in team1],
+                                              [elo_map.get(n, 0) for n in team2]))
 
             col.markdown(f"**Equipo 1 ({elo1} ELO)**")
             for nombre in team1:
@@ -690,6 +801,8 @@ def panel_generacion():
 
         if chosen_idx is not None:
             st.session_state._equipos_actual = opts[chosen_idx][:]  # copia
+            bitacora.registrar("seleccion", partido_id, st.session_state.get("_equipos_corrida", ""),
+                               opcion=chosen_idx, equipos=opts[chosen_idx])
             st.success(f"Opción {chosen_idx+1} cargada. Podés intercambiar jugadores antes de confirmar.")
 
     # Ajuste manual e Confirmación (con asignación por defecto de camisetas)
@@ -720,6 +833,8 @@ def panel_generacion():
                 i2 = team2.index(b)
                 team1[i1], team2[i2] = team2[i2], team1[i1]
                 st.session_state._equipos_actual = team1 + team2
+                bitacora.registrar("intercambio", partido_id, st.session_state.get("_equipos_corrida", ""),
+                                   sale_e1=a, sale_e2=b, equipos=team1 + team2)
 
         equipo_actual = st.session_state._equipos_actual
         team1 = equipo_actual[:5]
@@ -728,10 +843,16 @@ def panel_generacion():
         elo2 = int(sum(elo_map.get(n, 0) for n in team2 if n))
         st.markdown(f"**Equipo 1 ({elo1} ELO)**: " + ", ".join([n for n in team1 if n]))
         st.markdown(f"**Equipo 2 ({elo2} ELO)**: " + ", ".join([n for n in team2 if n]))
+        st.caption(_texto_probabilidades([elo_map.get(n, 0) for n in team1 if n],
+                                         [elo_map.get(n, 0) for n in team2 if n]))
 
         if st.button("✅ Confirmar equipos", key="btn_confirmar_equipos"):
             if len([n for n in team1 if n]) == 5 and len([n for n in team2 if n]) == 5:
-                guardar_opcion(partido_id, equipo_actual)
+                guardar_opcion(partido_id, equipo_actual, elo_map=elo_map, criterio=criterio)
+                bitacora.registrar("confirmacion", partido_id, st.session_state.get("_equipos_corrida", ""),
+                                   bitacora.hash_roster(jugadores, bloques),
+                                   equipos=equipo_actual, elo1=elo1, elo2=elo2)
+                bitacora.vaciar()
                 # Asignación por defecto de camisetas si no hay
                 if obtener_camiseta_equipo(partido_id, 1) is None:
                     asignar_camiseta_equipo(partido_id, 1, "clara")
@@ -741,6 +862,7 @@ def panel_generacion():
                 st.session_state._equipos_opciones = None
                 st.session_state._equipos_diffs = None
                 st.session_state._equipos_actual = None
+                st.session_state._equipos_corrida = None
                 st.rerun()
             else:
                 st.error("Cada equipo debe tener exactamente 5 jugadores.")
@@ -0,0 +1,159 @@
+# forma.py
+# Forma reciente por jugador: últimos 5 / 10 oficiales (puntos, ΔELO, diferencia de gol).
+# Cada jugador tiene un buffer circular de CAPACIDAD entradas guardado compacto como BLOB
+# (array estructurado de NumPy) en `jugador_forma`. Al registrar un oficial se empuja una
+# entrada en O(1) dentro de la misma transacción; al deshacer (o si el partido registrado es
+# anterior al último del jugador) se reconstruyen sólo los participantes con una consulta.
+
+import numpy as np
+from database import get_connection
+
+CAPACIDAD = 10
+PESO_FORMA = 0.5   # ELO sumado por cada punto de ΔELO de la ventana al balancear (opcional)
+
+DTYPE = np.dtype([("partido_id", "<i4"), ("puntos", "<i1"), ("delta_elo", "<f4"), ("dif_gol", "<i2")])
+
+_RES = "CASE WHEN COALESCE(p.ganador, 0) = 0 THEN 0 WHEN p.ganador = pj.equipo THEN 1 ELSE -1 END"
+
+# Entradas oficiales por jugador: puntos 3/1/0, ΔELO desde historial_elo, dif. de gol con signo
+SQL_ENTRADAS = f"""
+SELECT jugador_id, partido_id, puntos, delta_elo, dif_gol
+  FROM (SELECT pj.jugador_id, p.id AS partido_id,
+               CASE {_RES} WHEN 1 THEN 3 WHEN 0 THEN 1 ELSE 0 END AS puntos,
+               he.elo_despues - he.elo_antes AS delta_elo,
+               ({_RES}) * ABS(COALESCE(p.diferencia_gol, 0)) AS dif_gol,
+               ROW_NUMBER() OVER (PARTITION BY pj.jugador_id
+                                  ORDER BY p.fecha_iso DESC, p.id DESC) AS nro
+          FROM partido_jugadores pj
+          JOIN partidos p ON p.id = pj.partido_id
+          JOIN historial_elo he ON he.partido_id = p.id AND he.jugador_id = pj.jugador_id
+         WHERE pj.equipo IN (1, 2)
+           AND p.es_oficial = 1
+           AND (p.ganador IS NOT NULL OR p.diferencia_gol IS NOT NULL)
+           {{filtro}})
+ WHERE nro <= {CAPACIDAD}
+ ORDER BY jugador_id, nro DESC
+"""
+
+# -------------------------
+# Buffer circular
+# -------------------------
+def _vacio():
+    return np.zeros(CAPACIDAD, dtype=DTYPE), 0, 0  # (buffer, cabeza, n)
+
+def _empujar(buf, cabeza, n, entrada):
+    buf[cabeza] = entrada
+    return buf, (cabeza + 1) % CAPACIDAD, min(n + 1, CAPACIDAD)
+
+def _cronologico(buf, cabeza, n):
+    """Entradas de la más vieja a la más reciente."""
+    return np.roll(buf, -cabeza)[CAPACIDAD - n:] if n == CAPACIDAD else buf[:n]
+
+def _desempaquetar(blob):
+    return np.frombuffer(blob, dtype=DTYPE).copy()
+
+# -------------------------
+# Mantenimiento (con el cursor de la transacción del resultado)
+# -------------------------
+def _guardar(cur, filas):
+    cur.executemany("""
+        INSERT OR REPLACE INTO jugador_forma (jugador_id, cabeza, n, buffer) VALUES (?, ?, ?, ?)
+    """, [(jid, int(cabeza), int(n), buf.tobytes()) for jid, (buf, cabeza, n) in filas.items()])
+
+def reconstruir_jugadores(cur, jugador_ids=None):
+    """Rearma los buffers desde la historia (todos si jugador_ids es None)."""
+    filtro, params = "", ()
+    if jugador_ids is not None:
+        if not jugador_ids:
+            return
+        filtro = "AND pj.jugador_id IN (%s)" % ",".join("?" * len(jugador_ids))
+        params = tuple(jugador_ids)
+        cur.execute("DELETE FROM jugador_forma WHERE jugador_id IN (%s)" % ",".join("?" * len(jugador_ids)),
+                    params)
+    else:
+        cur.execute("DELETE FROM jugador_forma")
+    cur.execute(SQL_ENTRADAS.format(filtro=filtro), params)
+    filas = {}
+    for jid, pid, puntos, delta, dif in cur.fetchall():
+        filas[jid] = _empujar(*filas.get(jid, _vacio()), (pid, puntos, delta or 0.0, dif))
+    _guardar(cur, filas)
+
+def agregar_partido(cur, partido_id: int):
+    """Empuja el oficial recién registrado en el buffer de cada participante."""
+    cur.execute(SQL_ENTRADAS.format(filtro="AND p.id = ?"), (partido_id,))
+    entradas = {r[0]: tuple(r[1:]) for r in cur.fetchall()}
+    if not entradas:
+        return
+    marcas = ",".join("?" * len(entradas))
+    # Si el jugador ya tiene un oficial posterior a éste, el orden no es "empujar al final"
+    cur.execute(f"""
+        SELECT DISTINCT pj.jugador_id
+          FROM partido_jugadores pj
+          JOIN partidos p ON p.id = pj.partido_id
+          JOIN partidos nuevo ON nuevo.id = ?
+         WHERE pj.jugador_id IN ({marcas}) AND pj.equipo IN (1, 2) AND p.es_oficial = 1
+           AND (p.fecha_iso > nuevo.fecha_iso
+                OR (p.fecha_iso = nuevo.fecha_iso AND p.id > nuevo.id))
+    """, (partido_id, *entradas))
+    fuera_de_orden = [r[0] for r in cur.fetchall()]
+
+    cur.execute(f"SELECT jugador_id, cabeza, n, buffer FROM jugador_forma WHERE jugador_id IN ({marcas})",
+                tuple(entradas))
+    actuales = {r[0]: (_desempaquetar(r[3]), r[1], r[2]) for r in cur.fetchall()}
+    filas = {}
+    for jid, (pid, puntos, delta, dif) in entradas.items():
+        if jid not in fuera_de_orden:
+            filas[jid] = _empujar(*actuales.get(jid, _vacio()), (pid, puntos, delta or 0.0, dif))
+    _guardar(cur, filas)
+    reconstruir_jugadores(cur, fuera_de_orden)
+
+_forma_verificada = False
+
+def asegurar_forma():
+    """Backfill de jugador_forma si está vacía y ya hay historial (una vez por proceso)."""
+    global _forma_verificada
+    if _forma_verificada:
+        return
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT EXISTS (SELECT 1 FROM jugador_forma), EXISTS (SELECT 1 FROM historial_elo)")
+        hay_forma, hay_historial = cur.fetchone()
+        if hay_historial and not hay_forma:
+            reconstruir_jugadores(cur)
+            conn.commit()
+    _forma_verificada = True
+
+# -------------------------
+# Lectura
+# -------------------------
+def forma_de(jugador_ids, ventana=5):
+    """
+    {jugador_id: {"partidos", "puntos", "delta_elo", "dif_gol"}} sobre los últimos `ventana`
+    oficiales de cada jugador. Una sola consulta para todo el grupo.
+    """
+    ids = list(jugador_ids)
+    if not ids:
+        return {}
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT jugador_id, cabeza, n, buffer FROM jugador_forma WHERE jugador_id IN (%s)"
+                    % ",".join("?" * len(ids)), tuple(ids))
+        rows = [tuple(r) for r in cur.fetchall()]
+    out = {jid: {"partidos": 0, "puntos": 0, "delta_elo": 0.0, "dif_gol": 0} for jid in ids}
+    for jid, cabeza, n, blob in rows:
+        ultimas = _cronologico(_desempaquetar(blob), cabeza, n)[-ventana:]
+        out[jid] = {
+            "partidos": len(ultimas),
+            "puntos": int(ultimas["puntos"].sum()),
+            "delta_elo": float(ultimas["delta_elo"].sum()),
+            "dif_gol": int(ultimas["dif_gol"].sum()),
+        }
+    return out
+
+def aplicar(jugadores, ventana=5, peso=PESO_FORMA):
+    """Suma peso·ΔELO reciente a j["elo"] (lista de dicts con 'jugador_id'); agrega j["forma"]."""
+    formas = forma_de([j["jugador_id"] for j in jugadores], ventana)
+    for j in jugadores:
+        j["forma"] = formas[j["jugador_id"]]
+        j["elo"] = j["elo"] + peso * j["forma"]["delta_elo"]
+    return jugadores
@@ -3,9 +3,17 @@ from db import get_connection
 from pathlib import Path
 from typing import Optional
 import calendar
+import tempfile
 from datetime import datetime, date
 import pandas as pd
 import streamlit as st
+import calendario
+
+try:  # Parquet opcional: sin pyarrow sólo se ofrece CSV
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 # =========================
 # Config & DB helpers
@@ -17,65 +25,121 @@ def get_conn():
     from db import get_connection as _gc
     return _gc()
 
-def read_sql_df(query: str, params: tuple = ()):
+def _valores(row, columnas):
+    """Fila -> tupla, tanto para filas tipo secuencia (sqlite3.Row) como tipo dict (adaptador)."""
+    if isinstance(row, dict):
+        return tuple(row[c] for c in columnas)
+    return tuple(row)
+
+def _dtype_inferido(valores):
+    """
+    Tipo de la columna según los valores que devolvió ESTA consulta (SQLite es de tipado dinámico:
+    el tipo declarado de la tabla no garantiza nada, y los alias/joins no lo conservan).
+    Sólo int -> Int64; int/float -> float64; cualquier otra mezcla (o todo NULL) -> object.
     """
-    Lee filas con el cursor y construye un DataFrame, autocasteando columnas
-    mayormente numéricas a float/int para evitar errores al operar con pandas.
+    tipos = set(map(type, valores)) - {type(None)}
+    if tipos == {int}:
+        return "Int64"
+    if tipos and tipos <= {int, float}:
+        return "float64"
+    return "object"
+
+def _df_tipado(filas, columnas, dtypes):
+    """Construye el DataFrame columna a columna con su dtype (sin autocast valor por valor)."""
+    cols = list(zip(*filas)) if filas else [()] * len(columnas)
+    datos = {}
+    for nombre, valores in zip(columnas, cols):
+        dtype = dtypes.get(nombre) or _dtype_inferido(valores)
+        # dtype explícito que no encaja con los valores devueltos: se degrada a float / object
+        for intento in (dtype, "float64", "object"):
+            try:
+                datos[nombre] = pd.array(valores, dtype=intento)
+                break
+            except (TypeError, ValueError):
+                continue
+    return pd.DataFrame(datos, columns=columnas)
+
+def read_sql_df(query: str, params: tuple = (), dtypes: Optional[dict] = None):
+    """
+    Lee una consulta a un DataFrame con columnas tipadas (nombres desde cursor.description).
+    Tipos: `dtypes` explícitos por columna > inferido de los valores devueltos.
     """
     with get_connection() as conn:
         cur = conn.cursor()
         cur.execute(query, params)
-        rows = cur.fetchall()
-
-    if not rows:
+        columnas = [d[0] for d in cur.description]
+        filas = [_valores(r, columnas) for r in cur.fetchall()]
+    if not filas:
         return pd.DataFrame()
+    return _df_tipado(filas, columnas, dtypes or {})
 
-    df = pd.DataFrame(rows)
-
-    # --- Autocast numérico en columnas mayormente numéricas ---
-    def _mostly_numeric(s: pd.Series, thresh: float = 0.7) -> bool:
-        nn = s.dropna()
-        if len(nn) == 0:
-            return False
-        ok = 0
-        for v in nn:
-            try:
-                float(str(v).replace(",", "."))
-                ok += 1
-            except Exception:
-                pass
-        return ok / len(nn) >= thresh
-
-    for c in df.columns:
-        if df[c].dtype == object and _mostly_numeric(df[c]):
-            df[c] = pd.to_numeric(df[c].astype(str).str.replace(",", ".", regex=False), errors="coerce")
-
-    return df
+def iter_sql_df(query: str, params: tuple = (), chunk: int = 5000, dtypes: Optional[dict] = None):
+    """
+    Igual que read_sql_df pero en bloques de `chunk` filas (fetchmany), para resultados grandes.
+    Pasar `dtypes` para todas las columnas si los bloques deben compartir esquema (p. ej. Parquet).
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        columnas = [d[0] for d in cur.description]
+        while True:
+            filas = cur.fetchmany(chunk)
+            if not filas:
+                break
+            yield _df_tipado([_valores(r, columnas) for r in filas], columnas, dtypes or {})
 
 # =========================
 # SQL base
 # =========================
-SQL_JUGADORES_DE_PARTIDO = """
+SQL_JUGADORES_DE_PARTIDOS = """
 SELECT pj.partido_id, pj.equipo, pj.camiseta, j.id AS jugador_id, j.nombre AS jugador_nombre
 FROM partido_jugadores pj
 JOIN jugadores j ON j.id = pj.jugador_id
-WHERE pj.partido_id = ?
-ORDER BY pj.equipo ASC, j.nombre ASC;
+WHERE pj.partido_id IN ({marcas})
+ORDER BY pj.partido_id ASC, pj.equipo ASC, j.nombre ASC;
 """
 
-SQL_HISTORIAL_ELO_BASE = """
+# Historial de ELO filtrado y ordenado por he.id (orden de registro) para paginar por keyset:
+# con jugador usa idx_historial_elo_jugador (jugador_id, id), con partido idx_historial_elo_partido.
+SQL_HISTORIAL_ELO = """
 SELECT
-  he.id               AS historial_id,
-  he.fecha            AS fecha,
-  he.jugador_id       AS jugador_id,
-  j.nombre            AS jugador_nombre,
-  he.partido_id       AS partido_id,
-  he.elo_antes        AS elo_antes,
-  he.elo_despues      AS elo_despues
+  he.id                                               AS historial_id,
+  COALESCE(he.fecha, p.fecha_iso)                     AS fecha,
+  he.jugador_id                                       AS jugador_id,
+  j.nombre                                            AS jugador_nombre,
+  he.partido_id                                       AS partido_id,
+  he.elo_antes                                        AS elo_antes,
+  he.elo_despues                                      AS elo_despues,
+  printf('%+.1f', he.elo_despues - he.elo_antes)      AS "ΔELO"
 FROM historial_elo he
 JOIN jugadores j ON j.id = he.jugador_id
+LEFT JOIN partidos p ON p.id = he.partido_id
+WHERE 1 = 1 {filtro}
+ORDER BY he.id {orden}
 """
 
+# Tipos explícitos: historial_elo.fecha está declarada INTEGER pero guarda texto ISO o NULL
+DTYPES_HISTORIAL_ELO = {
+    "historial_id": "Int64", "fecha": "string", "jugador_id": "Int64", "jugador_nombre": "string",
+    "partido_id": "Int64", "elo_antes": "float64", "elo_despues": "float64", "ΔELO": "string",
+}
+
+ELO_POR_PAGINA = 200
+
+def _consulta_historial_elo(jugador_id=None, partido_id=None, desc=True, despues_de=None):
+    """(sql, params) del historial filtrado; `despues_de` = último historial_id de la página previa."""
+    filtro, params = "", []
+    if jugador_id is not None:
+        filtro += " AND he.jugador_id = ?"
+        params.append(jugador_id)
+    if partido_id is not None:
+        filtro += " AND he.partido_id = ?"
+        params.append(partido_id)
+    if despues_de is not None:
+        filtro += " AND he.id < ?" if desc else " AND he.id > ?"
+        params.append(despues_de)
+    return SQL_HISTORIAL_ELO.format(filtro=filtro, orden="DESC" if desc else "ASC"), tuple(params)
+
 # =========================
 # UI utils (badges + helpers)
 # =========================
@@ -122,88 +186,38 @@ def _oficial_texto(es_oficial):
 def _oficial_color(es_oficial):
     return "#2563eb" if es_oficial else "#64748b"
 
-def _delta_str(antes, despues):
-    try:
-        d = float(despues) - float(antes)
-    except Exception:
-        return ""
-    signo = "+" if d >= 0 else ""
-    return "%s%.1f" % (signo, d)
-
 # =========================
 # Calendario helpers + estilos
 # =========================
 MESES_NOMBRES = ["Ene","Feb","Mar","Abr","May","Jun","Jul","Ago","Sep","Oct","Nov","Dic"]
 DIAS_HDR = ["Lu","Ma","Mi","Ju","Vi","Sá","Do"]  # una sola línea
 
-# Estilos: TODOS los días (y huecos) se renderizan con el MISMO alto/ancho
+# Estilos: cada mes es UNA tabla HTML estática (sin widgets por celda)
 _CALENDAR_CSS = """
 <style>
-/* ámbito local del calendario */
-.cal-wrap .stButton > button {
-  width: 100%;
-  height: 40px;            /* alto fijo */
-  padding: 0;
-  border-radius: 10px;
-  white-space: nowrap;     /* evita saltos de línea */
-}
-.cal-wrap .day-empty .stButton > button{
-  opacity: 0.35;           /* huecos más tenues */
-}
-.cal-wrap .month-box{
+.cal-month{
   border: 1px solid rgba(255,255,255,0.12);
   border-radius: 12px;
-  padding: 10px 12px;
-  margin-bottom: 12px;
-}
-.cal-wrap .month-title{
-  margin: 0 0 8px 0;
-}
-.cal-wrap .weekday{
-  text-align: center;
-  font-weight: 600;
+  padding: 10px 12px 4px;
   margin-bottom: 6px;
 }
+.cal-month h4{ margin: 0 0 8px 0; }
+.cal-month table{ width: 100%; border-collapse: separate; border-spacing: 4px; table-layout: fixed; }
+.cal-month th{ text-align: center; font-weight: 600; font-size: 0.85rem; border: none; padding: 0; }
+.cal-month td{
+  text-align: center; height: 34px; padding: 0; border: none;
+  border-radius: 8px; font-size: 0.9rem; background: rgba(148,163,184,0.12);
+}
+.cal-month td.vacio{ background: transparent; }
+.cal-month td.jugado{ background: #2563eb; color: white; font-weight: 700; }
+.cal-month td.amistoso{ background: #64748b; color: white; font-weight: 700; }
+.cal-month td.sel{ outline: 2px solid #f59e0b; }
 </style>
 """
 
 def _years_available():
-    df = read_sql_df("""
-        SELECT DISTINCT SUBSTR(fecha,1,4) AS anio
-        FROM partidos
-        WHERE fecha IS NOT NULL AND TRIM(fecha)!=''
-        ORDER BY anio DESC
-    """)
-    if df.empty:
-        return [str(datetime.now().year)]
-    return df["anio"].astype(str).tolist()
-
-def _days_with_match(year: int, month: int):
-    """
-    Devuelve set de días (int) con al menos un partido:
-    - con resultado (ganador o diferencia_gol no nulos)
-    - con jugadores asignados
-    - con fecha <= hoy
-    """
-    today_iso = date.today().isoformat()  # 'YYYY-MM-DD'
-    df = read_sql_df("""
-        SELECT DISTINCT CAST(SUBSTR(p.fecha, 9, 2) AS INT) AS dia
-          FROM partidos p
-         WHERE SUBSTR(p.fecha,1,4) = ?
-           AND CAST(SUBSTR(p.fecha,6,2) AS INT) = ?
-           AND SUBSTR(p.fecha,1,10) <= ?
-           AND (p.ganador IS NOT NULL OR p.diferencia_gol IS NOT NULL)
-           AND EXISTS (
-                 SELECT 1 FROM partido_jugadores pj
-                  WHERE pj.partido_id = p.id
-           )
-    """, (str(year), month, today_iso))
-
-    if df.empty or "dia" not in df.columns:
-        return set()
-
-    dias = pd.to_numeric(df["dia"], errors="coerce")
-    return set(dias.dropna().astype(int).tolist())
+    anios = calendario.anios_disponibles()
+    return anios or [str(datetime.now().year)]
 
 def _partidos_by_date(date_iso: str):
     """
@@ -221,7 +235,7 @@ def _partidos_by_date(date_iso: str):
                p.es_oficial
           FROM partidos p
      LEFT JOIN canchas c ON c.id = p.cancha_id
-         WHERE SUBSTR(p.fecha,1,10) = ?
+         WHERE p.fecha_iso = ?
            AND (p.ganador IS NOT NULL OR p.diferencia_gol IS NOT NULL)
            AND EXISTS (
                  SELECT 1 FROM partido_jugadores pj
@@ -230,91 +244,117 @@ def _partidos_by_date(date_iso: str):
       ORDER BY p.id ASC
     """, (date_iso,))
 
+def _planteles_por_partido(partido_ids):
+    """
+    Planteles de varios partidos en UNA consulta IN (...), agrupados en memoria:
+    {partido_id: {equipo: [(nombre, camiseta), ...]}}
+    """
+    if not partido_ids:
+        return {}
+    marcas = ",".join("?" * len(partido_ids))
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_JUGADORES_DE_PARTIDOS.format(marcas=marcas), tuple(partido_ids))
+        rows = cur.fetchall()
+    out = {}
+    for r in rows:
+        out.setdefault(r["partido_id"], {}).setdefault(r["equipo"], []).append((r["jugador_nombre"], r["camiseta"]))
+    return out
+
+def _render_plantel(plantel):
+    if not plantel:
+        st.caption("Sin jugadores asignados.")
+        return
+    for eq in (1, 2):
+        jugadores = plantel.get(eq, [])
+        if not jugadores:
+            st.write("**%s:** (sin datos)" % _equipo_label(eq))
+            continue
+        camisetas = [c for _, c in jugadores if c]
+        cam = max(set(camisetas), key=camisetas.count) if camisetas else None
+        lista = " · ".join(n for n, _ in jugadores)
+        st.write("**%s %s:** %s" % (_equipo_label(eq), _camiseta_emoji(cam), lista))
+
 def _render_partidos_detail_for_day(date_iso: str):
     df = _partidos_by_date(date_iso)
     if df.empty:
         st.info("No se encontraron partidos para esta fecha.")
         return
-    for _, row in df.iterrows():
-        pid = int(row["partido_id"])
-        fecha = str(row["fecha"])
-        cancha = row["cancha"]
-        es_ofi = bool(row["es_oficial"])
-        dif = row["diferencia_gol"]
-        ganador = row["ganador"]
-        with st.expander("Partido #%d — %s — %s" % (pid, fecha, cancha), expanded=False):
+    planteles = _planteles_por_partido([int(p) for p in df["partido_id"]])  # una consulta para el día
+    for row in df.itertuples(index=False):
+        pid = int(row.partido_id)
+        fecha = str(row.fecha)
+        es_ofi = bool(row.es_oficial)
+        dif = row.diferencia_gol
+        ganador = None if pd.isna(row.ganador) else int(row.ganador)
+        # Con on_change="rerun" el expander informa .open: el plantel se dibuja sólo si está abierto
+        exp = st.expander("Partido #%d — %s — %s" % (pid, fecha, row.cancha), expanded=False,
+                          key="hist_dia_exp_%d" % pid, on_change="rerun")
+        with exp:
             _badge(_oficial_texto(es_ofi), _oficial_color(es_ofi))
             if pd.notna(dif):
-                try:
-                    st_diff = int(float(dif))
-                except Exception:
-                    st_diff = None
-                if st_diff is not None:
-                    _badge("Diff: %d" % st_diff, "#334155")
-            if ganador is None and (str(dif) == "0" or str(dif).strip() == "0.0"):
+                _badge("Diff: %d" % int(dif), "#334155")
+            if ganador is None and pd.notna(dif) and int(dif) == 0:
                 resultado_txt = "Empate"
             else:
                 resultado_txt = _ganador_texto_simple(ganador)
             st.markdown("**Resultado:** %s" % resultado_txt)
-
-            df_j = read_sql_df(SQL_JUGADORES_DE_PARTIDO, (pid,))
-            if df_j.empty:
-                st.caption("Sin jugadores asignados.")
-            else:
-                for eq in (1, 2):
-                    sub = df_j[df_j["equipo"] == eq]
-                    if sub.empty:
-                        st.write("**%s:** (sin datos)" % _equipo_label(eq))
-                        continue
-                    cam = sub["camiseta"].mode().iloc[0] if sub["camiseta"].notna().any() else None
-                    icon = _camiseta_emoji(cam)
-                    lista = " · ".join(sub["jugador_nombre"].tolist())
-                    st.write("**%s %s:** %s" % (_equipo_label(eq), icon, lista))
-
-def _render_month(year: int, month: int, key_prefix: str):
-    cal = calendar.Calendar(firstweekday=0)  # 0 = lunes
-    weeks = cal.monthdayscalendar(year, month)
-    days_with = _days_with_match(year, month)
-
-    # Caja del mes
-    with st.container():
-        st.markdown('<div class="month-box">', unsafe_allow_html=True)
-        st.markdown('<h4 class="month-title">%s %d</h4>' % (MESES_NOMBRES[month-1], year), unsafe_allow_html=True)
-
-        # Encabezado (misma grilla de 7 columnas)
-        hdr_cols = st.columns(7, gap="small")
-        for i, name in enumerate(DIAS_HDR):
-            with hdr_cols[i]:
-                st.markdown('<div class="weekday">%s</div>' % name, unsafe_allow_html=True)
-
-        # Celdas (7 columnas por semana)
-        for w_idx, week in enumerate(weeks):
-            row_cols = st.columns(7, gap="small")
-            for d_idx, day in enumerate(week):
-                with row_cols[d_idx]:
-                    if day == 0:
-                        # Hueco con el mismo alto que un botón normal
-                        st.markdown('<div class="day-empty">', unsafe_allow_html=True)
-                        st.button(" ", key="%s_blank_%d_%02d_%d_%d" % (key_prefix, year, month, w_idx, d_idx),
-                                  disabled=True, use_container_width=True)
-                        st.markdown('</div>', unsafe_allow_html=True)
-                        continue
-
-                    has_match = day in days_with
-                    label = ("%02d 🔵" % day) if has_match else ("%02d ⚪" % day)
-                    btn_key = "%s_day_%d_%02d_%02d" % (key_prefix, year, month, day)
-                    clicked = st.button(label, key=btn_key, use_container_width=True)
-                    if clicked:
-                        st.session_state["hist_cal_selected_date"] = "%d-%02d-%02d" % (year, month, day)
-
-        st.markdown('</div>', unsafe_allow_html=True)  # /month-box
+            if exp.open:
+                _render_plantel(planteles.get(pid))
+
+def _html_month(year: int, month: int, dias_anio: dict, seleccion: Optional[str]) -> str:
+    """Grilla del mes como HTML estático: días oficiales en azul, sólo amistosos en gris."""
+    filas = []
+    for week in calendar.Calendar(firstweekday=0).monthdayscalendar(year, month):  # 0 = lunes
+        celdas = []
+        for day in week:
+            if day == 0:
+                celdas.append('<td class="vacio"></td>')
+                continue
+            info = dias_anio.get((month, day))
+            clases = []
+            titulo = ""
+            if info:
+                clases.append("jugado" if info["oficiales"] else "amistoso")
+                titulo = ' title="%d partido(s), %d oficial(es)"' % (info["partidos"], info["oficiales"])
+            if seleccion == "%d-%02d-%02d" % (year, month, day):
+                clases.append("sel")
+            celdas.append('<td class="%s"%s>%d</td>' % (" ".join(clases), titulo, day))
+        filas.append("<tr>%s</tr>" % "".join(celdas))
+    hdr = "".join("<th>%s</th>" % d for d in DIAS_HDR)
+    return ('<div class="cal-month"><h4>%s %d</h4><table><tr>%s</tr>%s</table></div>'
+            % (MESES_NOMBRES[month - 1], year, hdr, "".join(filas)))
+
+def _seleccionar_dia(key: str, year: int, month: int, key_prefix: str):
+    dia = st.session_state.get(key)
+    if dia is not None:
+        st.session_state["hist_cal_selected_date"] = "%d-%02d-%02d" % (year, month, dia)
+    # Una sola selección en todo el calendario: se limpian los radios de los otros meses
+    # (si no, el día viejo queda marcado y volver a elegirlo no dispara on_change)
+    for otra in [k for k in st.session_state if str(k).startswith(key_prefix + "_radio_") and k != key]:
+        st.session_state[otra] = None
+
+def _render_month(year: int, month: int, key_prefix: str, dias_anio=None):
+    """Un bloque HTML + (sólo si hubo partidos) UN radio con los días jugados del mes."""
+    if dias_anio is None:
+        dias_anio = calendario.dias_con_partido(year)
+    seleccion = st.session_state.get("hist_cal_selected_date")
+    st.markdown(_html_month(year, month, dias_anio, seleccion), unsafe_allow_html=True)
+
+    dias = sorted(d for (m, d) in dias_anio if m == month)
+    if dias:
+        key = "%s_radio_%d_%02d" % (key_prefix, year, month)
+        st.radio("Días jugados", dias, index=None, key=key, horizontal=True,
+                 format_func=lambda d: "%02d" % d, label_visibility="collapsed",
+                 on_change=_seleccionar_dia, args=(key, year, month, key_prefix))
 
 def _render_year_calendar_grid(year: int):
     # CSS global del calendario
     st.markdown(_CALENDAR_CSS, unsafe_allow_html=True)
-    st.markdown('<div class="cal-wrap">', unsafe_allow_html=True)
 
-    st.caption("Tocá un día 🔵 para ver sus partidos (⚪ = sin partido).")
+    st.caption("Elegí un día jugado debajo de cada mes para ver sus partidos "
+               "(azul = con oficiales, gris = sólo amistosos).")
+    dias_anio = calendario.dias_con_partido(year)  # una sola consulta (cacheada) para los 12 meses
 
     # 2 meses por fila, con columna separadora
     for fila in range(6):  # hasta 12 meses (6 filas × 2 columnas)
@@ -325,10 +365,10 @@ def _render_year_calendar_grid(year: int):
 
         left_col, spacer, right_col = st.columns([1, 0.08, 1], gap="large")
         with left_col:
-            _render_month(year, month_left, key_prefix="histcal")
+            _render_month(year, month_left, key_prefix="histcal", dias_anio=dias_anio)
         if month_right <= 12:
             with right_col:
-                _render_month(year, month_right, key_prefix="histcal")
+                _render_month(year, month_right, key_prefix="histcal", dias_anio=dias_anio)
 
         # Separación entre filas de meses
         st.markdown("&nbsp;", unsafe_allow_html=True)
@@ -342,7 +382,69 @@ def _render_year_calendar_grid(year: int):
     else:
         st.caption("Seleccioná una fecha para ver su detalle.")
 
-    st.markdown('</div>', unsafe_allow_html=True)  # /cal-wrap
+# =========================
+# Exportación (CSV / Parquet por bloques)
+# =========================
+SQL_EXPORT_PARTIDOS = """
+SELECT p.id AS partido_id, p.fecha_iso AS fecha, p.hora, p.cancha_id, c.nombre AS cancha, p.tipo,
+       p.es_oficial, p.ganador, p.diferencia_gol
+  FROM partidos p
+  LEFT JOIN canchas c ON c.id = p.cancha_id
+ ORDER BY p.id
+"""
+
+SQL_EXPORT_PLANTELES = """
+SELECT pj.partido_id, p.fecha_iso AS fecha, pj.equipo, pj.camiseta, pj.jugador_id, j.nombre AS jugador_nombre
+  FROM partido_jugadores pj
+  JOIN partidos p ON p.id = pj.partido_id
+  JOIN jugadores j ON j.id = pj.jugador_id
+ ORDER BY pj.partido_id, pj.equipo, pj.jugador_id
+"""
+
+# dtypes fijos: todos los bloques comparten el mismo esquema (necesario para el ParquetWriter)
+EXPORTACIONES = {
+    "partidos": (SQL_EXPORT_PARTIDOS, {
+        "partido_id": "Int64", "fecha": "string", "hora": "string", "cancha_id": "Int64",
+        "cancha": "string", "tipo": "string", "es_oficial": "Int64", "ganador": "Int64",
+        "diferencia_gol": "Int64"}),
+    "planteles": (SQL_EXPORT_PLANTELES, {
+        "partido_id": "Int64", "fecha": "string", "equipo": "Int64", "camiseta": "string",
+        "jugador_id": "Int64", "jugador_nombre": "string"}),
+    "historial_elo": (_consulta_historial_elo(desc=False)[0], DTYPES_HISTORIAL_ELO),
+}
+EXPORT_CHUNK = 5000
+
+def exportar_csv(nombre: str, destino):
+    """Escribe la exportación `nombre` como CSV (UTF-8) en el archivo binario `destino`, bloque a bloque."""
+    sql, dtypes = EXPORTACIONES[nombre]
+    primero = True
+    for df in iter_sql_df(sql, chunk=EXPORT_CHUNK, dtypes=dtypes):
+        destino.write(df.to_csv(index=False, header=primero).encode("utf-8"))
+        primero = False
+    if primero:  # sin filas: al menos el encabezado
+        destino.write((",".join(dtypes) + "\n").encode("utf-8"))
+
+def exportar_parquet(nombre: str, destino):
+    """Escribe la exportación `nombre` como Parquet en `destino`: un row group por bloque (requiere pyarrow)."""
+    if pq is None:
+        raise RuntimeError("Exportar a Parquet requiere pyarrow.")
+    sql, dtypes = EXPORTACIONES[nombre]
+    esquema = pa.Schema.from_pandas(pd.DataFrame({c: pd.Series(dtype=t) for c, t in dtypes.items()}),
+                                    preserve_index=False)
+    with pq.ParquetWriter(destino, esquema) as writer:
+        for df in iter_sql_df(sql, chunk=EXPORT_CHUNK, dtypes=dtypes):
+            writer.write_table(pa.Table.from_pandas(df, schema=esquema, preserve_index=False))
+
+def _archivo_exportado(nombre: str, formato: str) -> bytes:
+    """
+    Genera la exportación por bloques en un archivo temporal en disco y devuelve sus bytes.
+    La generación no arma un DataFrame completo, pero st.download_button guarda el archivo final
+    entero en su almacenamiento en memoria: el costo en RAM es el tamaño del archivo exportado.
+    """
+    with tempfile.TemporaryFile() as f:
+        (exportar_parquet if formato == "parquet" else exportar_csv)(nombre, f)
+        f.seek(0)
+        return f.read()
 
 # =========================
 # Tabs
@@ -359,45 +461,185 @@ def _render_tab_calendario():
 
     _render_year_calendar_grid(year)
 
+def _pagina_historial_elo(jugador_id, partido_id, desc, despues_de):
+    """Una página (+1 fila para saber si hay siguiente)."""
+    sql, params = _consulta_historial_elo(jugador_id, partido_id, desc, despues_de)
+    df = read_sql_df(sql + " LIMIT ?", params + (ELO_POR_PAGINA + 1,), dtypes=DTYPES_HISTORIAL_ELO)
+    hay_siguiente = len(df) > ELO_POR_PAGINA
+    return df.head(ELO_POR_PAGINA), hay_siguiente
+
+def _jugadores_con_historial():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT j.id, j.nombre
+              FROM jugadores j
+             WHERE EXISTS (SELECT 1 FROM historial_elo he WHERE he.jugador_id = j.id)
+          ORDER BY j.nombre
+        """)
+        return [tuple(_valores(r, ("id", "nombre"))) for r in cur.fetchall()]
+
 def _render_tab_historial_elo():
     st.subheader("📈 Historial de ELO")
 
-    df = read_sql_df(SQL_HISTORIAL_ELO_BASE + " ORDER BY datetime(fecha) DESC, historial_id DESC")
-    if df.empty:
+    jugadores = _jugadores_con_historial()
+    if not jugadores:
         st.info("Aún no hay cambios de ELO registrados.")
         return
+    nombres = dict(jugadores)
 
     with st.container():
         col1, col2, col3 = st.columns([1, 1, 1])
         with col1:
-            jugadores_unicos = ["(Todos)"] + sorted(df["jugador_nombre"].dropna().unique().tolist())
-            jug_sel = st.selectbox("Filtrar por jugador", jugadores_unicos, index=0, key="hist_elo_sel_jugador")
+            jug_sel = st.selectbox("Filtrar por jugador", [None] + [jid for jid, _ in jugadores], index=0,
+                                   format_func=lambda jid: "(Todos)" if jid is None else nombres[jid],
+                                   key="hist_elo_sel_jugador")
         with col2:
             id_part = st.text_input("Filtrar por ID de partido", value="", key="hist_elo_filtro_partido")
         with col3:
-            ordenar_desc = st.toggle("Ordenar por fecha descendente", value=True, key="hist_elo_toggle_order")
+            ordenar_desc = st.toggle("Más recientes primero", value=True, key="hist_elo_toggle_order")
 
-    if jug_sel != "(Todos)":
-        df = df[df["jugador_nombre"] == jug_sel]
+    partido_id = None
     if id_part.strip():
-        df = df[df["partido_id"].astype(str).str.contains(id_part.strip())]
-
+        if not id_part.strip().isdigit():
+            st.warning("El ID de partido debe ser un número.")
+            return
+        partido_id = int(id_part.strip())
+
+    # Pila de cursores (último historial_id de cada página ya vista); se reinicia al cambiar filtros
+    filtros = (jug_sel, partido_id, ordenar_desc)
+    if st.session_state.get("hist_elo_filtros") != filtros:
+        st.session_state["hist_elo_filtros"] = filtros
+        st.session_state["hist_elo_cursores"] = []
+    cursores = st.session_state["hist_elo_cursores"]
+
+    df, hay_siguiente = _pagina_historial_elo(jug_sel, partido_id, ordenar_desc,
+                                              cursores[-1] if cursores else None)
     if df.empty:
         st.warning("No hay resultados con esos filtros.")
         return
 
-    df = df.copy()
-    df["ΔELO"] = df.apply(lambda r: _delta_str(r["elo_antes"], r["elo_despues"]), axis=1)
     cols_orden = ["fecha", "jugador_nombre", "partido_id", "elo_antes", "elo_despues", "ΔELO", "historial_id"]
-    df = df[cols_orden]
+    st.dataframe(df[cols_orden], use_container_width=True, hide_index=True)
+
+    c_prev, c_info, c_next = st.columns([1, 2, 1])
+    with c_prev:
+        if st.button("⬅️ Anteriores", key="hist_elo_btn_prev", disabled=not cursores):
+            cursores.pop()
+            st.rerun()
+    with c_info:
+        st.caption("Página %d · %d filas por página" % (len(cursores) + 1, ELO_POR_PAGINA))
+    with c_next:
+        if st.button("Siguientes ➡️", key="hist_elo_btn_next", disabled=not hay_siguiente):
+            cursores.append(int(df["historial_id"].iloc[-1]))
+            st.rerun()
+
+def _render_tab_consistencia():
+    import consistencia_elo
+
+    st.subheader("🩺 Consistencia del ELO")
+    st.caption("Verifica elo_actual vs historial, una fila de historial por participante de cada oficial "
+               "y continuidad de la cadena elo_antes → elo_despues.")
+
+    if st.button("Verificar", key="hist_cons_btn_verificar"):
+        st.session_state["hist_cons_reporte"] = consistencia_elo.verificar()
+
+    reporte = st.session_state.get("hist_cons_reporte")
+    if reporte is None:
+        return
 
-    if ordenar_desc:
-        df = df.sort_values(by=["fecha", "historial_id"], ascending=[False, False]).reset_index(drop=True)
-    else:
-        df = df.sort_values(by=["fecha", "historial_id"], ascending=[True, True]).reset_index(drop=True)
+    if consistencia_elo.es_consistente(reporte):
+        st.success("Sin inconsistencias.")
+        return
+
+    for clave, filas in reporte.items():
+        titulo = consistencia_elo.TITULOS[clave]
+        if not filas:
+            st.write("✅ %s" % titulo)
+            continue
+        with st.expander("⚠️ %s (%d)" % (titulo, len(filas)), expanded=False):
+            st.dataframe(pd.DataFrame(filas), use_container_width=True, hide_index=True)
+
+    st.caption("La reparación colapsa duplicados, borra huérfanas, alinea elo_actual y regenera la "
+               "línea de tiempo. Filas faltantes y cortes de cadena requieren revisión manual.")
+    if st.button("🛠️ Reparar (atómico)", key="hist_cons_btn_reparar"):
+        st.session_state["hist_cons_reporte"] = consistencia_elo.reparar()
+        st.rerun()
+
+def _render_tab_pronostico():
+    import simulador
+
+    st.subheader("🔮 Pronóstico de temporada")
+    st.caption("Simulación Monte Carlo: fechas futuras con los jugadores activos, equipos armados por el "
+               "balanceador y resultados sorteados con el modelo de probabilidad.")
+
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        n_fechas = st.number_input("Fechas a simular", min_value=1, max_value=100, value=20, step=1,
+                                   key="hist_sim_fechas")
+    with c2:
+        n_sim = st.number_input("Simulaciones", min_value=100, max_value=50000, value=2000, step=500,
+                                key="hist_sim_n")
+    with c3:
+        K = st.number_input("Valor K", min_value=10, max_value=200, value=80, step=10, key="hist_sim_k")
+
+    if st.button("▶️ Simular", key="hist_sim_btn"):
+        try:
+            with st.spinner("Simulando temporadas..."):
+                st.session_state["hist_sim_resultado"] = simulador.simular_temporada(
+                    n_fechas=int(n_fechas), n_sim=int(n_sim), K=int(K))
+        except ValueError as e:
+            st.warning(str(e))
+
+    df = st.session_state.get("hist_sim_resultado")
+    if df is not None:
+        st.dataframe(df.drop(columns=["jugador_id"]), use_container_width=True, hide_index=True)
+        st.caption("p5…p95 = banda del ELO final; posicion_media y prob_campeon sobre todas las simulaciones.")
+
+def _render_tab_equidad():
+    import equidad
+
+    st.subheader("⚖️ Equidad de los equipos")
+    st.caption("¿Las opciones balanceadas terminaron en partidos parejos? Brecha = ELO promedio E1 − E2 "
+               "de la opción confirmada (o ELO previo del historial para partidos anteriores).")
+
+    r = equidad.resumen()
+    if not r["n"]:
+        st.info("Todavía no hay partidos con resultado para analizar.")
+        return
 
-    st.dataframe(df, use_container_width=True, hide_index=True)
-    st.caption("Tip: usa el buscador de la esquina superior derecha de la tabla para filtrar por texto.")
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Partidos analizados", r["n"])
+    c2.metric("Correlación |brecha| vs |dif. gol|", "—" if r["correlacion"] is None else f"{r['correlacion']:.2f}")
+    c3.metric("Brier P(gana E1)", "—" if r["brier"] is None else f"{r['brier']:.3f}")
+
+    st.write("### Por brecha de ELO")
+    st.dataframe(r["por_brecha"], use_container_width=True, hide_index=True)
+    st.write("### Calibración del modelo")
+    st.caption(f"Brier y calibración sobre {r['n_prob']} partidos con probabilidad guardada al confirmar equipos.")
+    if r["n_prob"]:
+        st.dataframe(r["calibracion"], use_container_width=True, hide_index=True)
+
+def _render_tab_exportar():
+    st.subheader("📤 Exportar datos")
+    st.caption("Descarga completa para análisis fuera de la app. El archivo se genera por bloques al "
+               "hacer clic; el archivo final se sirve desde memoria.")
+
+    formatos = ["csv"] + (["parquet"] if pq is not None else [])
+    formato = st.radio("Formato", formatos, horizontal=True, key="hist_exp_formato",
+                       format_func=lambda f: f.upper())
+    if pq is None:
+        st.caption("Instalá pyarrow para habilitar Parquet.")
+
+    mime = "application/vnd.apache.parquet" if formato == "parquet" else "text/csv"
+    for nombre in EXPORTACIONES:
+        st.download_button(
+            "⬇️ %s.%s" % (nombre, formato),
+            data=lambda nombre=nombre: _archivo_exportado(nombre, formato),
+            file_name="%s_%s.%s" % (nombre, date.today().isoformat(), formato),
+            mime=mime,
+            key="hist_exp_btn_%s" % nombre,
+        )
 
 # =========================
 # Public panel
@@ -405,11 +647,19 @@ def _render_tab_historial_elo():
 def panel_historial():
     st.title("6️⃣ Historial")
 
-    tabs = st.tabs(["Calendario", "Historial ELO"])
+    tabs = st.tabs(["Calendario", "Historial ELO", "Consistencia", "Pronóstico", "Equidad", "Exportar"])
     with tabs[0]:
         _render_tab_calendario()
     with tabs[1]:
         _render_tab_historial_elo()
+    with tabs[2]:
+        _render_tab_consistencia()
+    with tabs[3]:
+        _render_tab_pronostico()
+    with tabs[4]:
+        _render_tab_equidad()
+    with tabs[5]:
+        _render_tab_exportar()
 
     st.divider()
     if st.button("⬅️ Volver al menú principal", key="hist_btn_volver"):
@@ -78,12 +78,183 @@ CREATE TABLE IF NOT EXISTS historial_elo (
   FOREIGN KEY (jugador_id) REFERENCES jugadores(id),
   FOREIGN KEY (partido_id) REFERENCES partidos(id)
 );
+CREATE TABLE IF NOT EXISTS elo_timeline (
+  jugador_id INTEGER NOT NULL,
+  fecha TEXT NOT NULL,
+  partido_id INTEGER NOT NULL,
+  elo_antes REAL NOT NULL,
+  elo REAL NOT NULL,
+  PRIMARY KEY (jugador_id, fecha, partido_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_elo_timeline_partido ON elo_timeline(partido_id);
+CREATE INDEX IF NOT EXISTS idx_partido_jugadores_partido ON partido_jugadores(partido_id, equipo);
+CREATE INDEX IF NOT EXISTS idx_historial_elo_jugador ON historial_elo(jugador_id, id);
+CREATE INDEX IF NOT EXISTS idx_historial_elo_partido ON historial_elo(partido_id, jugador_id);
+CREATE INDEX IF NOT EXISTS idx_jugadores_elo ON jugadores(elo_actual DESC, id);
+CREATE TABLE IF NOT EXISTS modelo_prediccion (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  a REAL NOT NULL,
+  b REAL NOT NULL,
+  log_theta REAL NOT NULL,
+  n INTEGER NOT NULL,
+  actualizado TEXT
+);
+-- Agregado por jugador (lo mantiene el servicio de resultados en la misma transacción).
+-- *_previo guarda el estado anterior al último partido para deshacerlo en O(1).
+CREATE TABLE IF NOT EXISTS jugador_stats (
+  jugador_id INTEGER PRIMARY KEY,
+  jugados INTEGER NOT NULL DEFAULT 0,
+  victorias INTEGER NOT NULL DEFAULT 0,
+  empates INTEGER NOT NULL DEFAULT 0,
+  derrotas INTEGER NOT NULL DEFAULT 0,
+  dif_gol INTEGER NOT NULL DEFAULT 0,
+  oficiales_jugados INTEGER NOT NULL DEFAULT 0,
+  oficiales_victorias INTEGER NOT NULL DEFAULT 0,
+  oficiales_empates INTEGER NOT NULL DEFAULT 0,
+  oficiales_derrotas INTEGER NOT NULL DEFAULT 0,
+  racha INTEGER NOT NULL DEFAULT 0,
+  ultimo_partido TEXT,
+  ultimo_partido_id INTEGER,
+  racha_previa INTEGER,
+  ultimo_previo TEXT,
+  ultimo_previo_id INTEGER,
+  FOREIGN KEY (jugador_id) REFERENCES jugadores(id) ON DELETE CASCADE
+);
+-- Balance de la opción confirmada (ELO promedio por equipo y probabilidades predichas)
+CREATE TABLE IF NOT EXISTS partido_balance (
+  partido_id INTEGER PRIMARY KEY,
+  elo1 REAL NOT NULL,
+  elo2 REAL NOT NULL,
+  gap REAL NOT NULL,
+  p1 REAL,
+  pe REAL,
+  p2 REAL,
+  criterio TEXT,
+  confirmado TEXT,
+  FOREIGN KEY (partido_id) REFERENCES partidos(id) ON DELETE CASCADE
+);
+-- Bitácora append-only de la generación de equipos (ver bitacora.py)
+CREATE TABLE IF NOT EXISTS generaciones_log (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  creado TEXT NOT NULL,
+  partido_id INTEGER NOT NULL,
+  corrida TEXT NOT NULL,
+  evento TEXT NOT NULL CHECK (evento IN ('generacion','seleccion','intercambio','confirmacion')),
+  roster_hash TEXT,
+  datos TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_generaciones_log_partido ON generaciones_log(partido_id, id);
+CREATE TRIGGER IF NOT EXISTS trg_generaciones_log_sin_update
+BEFORE UPDATE ON generaciones_log
+BEGIN
+  SELECT RAISE(ABORT, 'generaciones_log es append-only');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_generaciones_log_sin_delete
+BEFORE DELETE ON generaciones_log
+BEGIN
+  SELECT RAISE(ABORT, 'generaciones_log es append-only');
+END;
+-- Sinergia de duplas aprendida (ver sinergia.py); sólo pares no nulos, jugador_a < jugador_b
+CREATE TABLE IF NOT EXISTS sinergia_pares (
+  jugador_a INTEGER NOT NULL,
+  jugador_b INTEGER NOT NULL,
+  valor REAL NOT NULL,
+  PRIMARY KEY (jugador_a, jugador_b)
+) WITHOUT ROWID;
+-- Generación del modelo de sinergia: `generacion` sube con cada resultado registrado/deshecho,
+-- `ajustada` es la generación que reflejan los pares guardados (compartida entre procesos)
+CREATE TABLE IF NOT EXISTS sinergia_estado (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  generacion INTEGER NOT NULL,
+  ajustada INTEGER NOT NULL
+);
+-- Forma reciente: buffer circular de los últimos oficiales (BLOB de NumPy, ver forma.py)
+CREATE TABLE IF NOT EXISTS jugador_forma (
+  jugador_id INTEGER PRIMARY KEY,
+  cabeza INTEGER NOT NULL,
+  n INTEGER NOT NULL,
+  buffer BLOB NOT NULL,
+  FOREIGN KEY (jugador_id) REFERENCES jugadores(id) ON DELETE CASCADE
+);
+-- Estado de cada partido en una sola agregación: inscriptos, tamaño de equipos,
+-- camiseta uniforme por equipo (NULL si falta o está mezclada) y presencia de resultado.
+CREATE VIEW IF NOT EXISTS v_partidos_estado AS
+SELECT p.id,
+       p.fecha,
+       p.tipo,
+       IFNULL(c.nombre, 'Sin asignar') AS cancha,
+       COUNT(pj.id) AS inscriptos,
+       IFNULL(SUM(pj.equipo = 1), 0) AS n_equipo1,
+       IFNULL(SUM(pj.equipo = 2), 0) AS n_equipo2,
+       CASE WHEN COUNT(DISTINCT CASE WHEN pj.equipo = 1 AND pj.camiseta <> '' THEN pj.camiseta END) = 1
+            THEN MAX(CASE WHEN pj.equipo = 1 AND pj.camiseta <> '' THEN pj.camiseta END) END AS camiseta1,
+       CASE WHEN COUNT(DISTINCT CASE WHEN pj.equipo = 2 AND pj.camiseta <> '' THEN pj.camiseta END) = 1
+            THEN MAX(CASE WHEN pj.equipo = 2 AND pj.camiseta <> '' THEN pj.camiseta END) END AS camiseta2,
+       (p.ganador IS NOT NULL OR p.diferencia_gol IS NOT NULL) AS tiene_resultado
+  FROM partidos p
+  LEFT JOIN partido_jugadores pj ON pj.partido_id = p.id
+  LEFT JOIN canchas c ON c.id = p.cancha_id
+ GROUP BY p.id;
 """
 
+# Columnas generadas sobre partidos.fecha (ALTER TABLE no admite IF NOT EXISTS: se agregan si faltan).
+# VIRTUAL: no ocupan espacio; los índices sobre ellas convierten los filtros por año/mes/día
+# en búsquedas por rango.
+COLUMNAS_FECHA = {
+    "anio": "INTEGER GENERATED ALWAYS AS (CAST(SUBSTR(fecha, 1, 4) AS INTEGER)) VIRTUAL",
+    "mes": "INTEGER GENERATED ALWAYS AS (CAST(SUBSTR(fecha, 6, 2) AS INTEGER)) VIRTUAL",
+    "dia": "INTEGER GENERATED ALWAYS AS (CAST(SUBSTR(fecha, 9, 2) AS INTEGER)) VIRTUAL",
+    "fecha_iso": "TEXT GENERATED ALWAYS AS (SUBSTR(fecha, 1, 10)) VIRTUAL",
+}
+
+FECHAS_SQL = """
+-- Reemplazado por los índices sobre las columnas generadas
+DROP INDEX IF EXISTS idx_partidos_fecha;
+CREATE INDEX IF NOT EXISTS idx_partidos_anio_mes_dia ON partidos(anio, mes, dia);
+CREATE INDEX IF NOT EXISTS idx_partidos_fecha_iso ON partidos(fecha_iso);
+-- fecha siempre 'YYYY-MM-DD'; la hora que venga en fecha pasa a `hora` (HHMM) si está vacía,
+-- igual que en _migrar_fechas. DROP + CREATE para que las bases existentes tomen el cuerpo vigente.
+DROP TRIGGER IF EXISTS trg_partidos_fecha_insert;
+CREATE TRIGGER trg_partidos_fecha_insert
+AFTER INSERT ON partidos WHEN LENGTH(NEW.fecha) > 10
+BEGIN
+  UPDATE partidos
+     SET hora = COALESCE(hora, CAST(SUBSTR(NEW.fecha, 12, 2) || SUBSTR(NEW.fecha, 15, 2) AS INTEGER)),
+         fecha = SUBSTR(NEW.fecha, 1, 10)
+   WHERE id = NEW.id;
+END;
+DROP TRIGGER IF EXISTS trg_partidos_fecha_update;
+CREATE TRIGGER trg_partidos_fecha_update
+AFTER UPDATE OF fecha ON partidos WHEN LENGTH(NEW.fecha) > 10
+BEGIN
+  UPDATE partidos
+     SET hora = COALESCE(hora, CAST(SUBSTR(NEW.fecha, 12, 2) || SUBSTR(NEW.fecha, 15, 2) AS INTEGER)),
+         fecha = SUBSTR(NEW.fecha, 1, 10)
+   WHERE id = NEW.id;
+END;
+"""
+
+def _migrar_fechas(cur):
+    columnas = {r[1] for r in cur.execute("PRAGMA table_xinfo(partidos)").fetchall()}
+    if "hora" not in columnas:  # bases creadas desde SCHEMA_SQL (los triggers la usan)
+        cur.execute("ALTER TABLE partidos ADD COLUMN hora INTEGER")
+    # Fechas viejas con hora ('YYYY-MM-DD HH:MM:SS'): la hora pasa a `hora` (HHMM) si está vacía
+    cur.execute("""
+        UPDATE partidos
+           SET hora = CAST(SUBSTR(fecha, 12, 2) || SUBSTR(fecha, 15, 2) AS INTEGER)
+         WHERE LENGTH(fecha) > 10 AND hora IS NULL
+    """)
+    cur.execute("UPDATE partidos SET fecha = SUBSTR(fecha, 1, 10) WHERE LENGTH(fecha) > 10")
+    for nombre, definicion in COLUMNAS_FECHA.items():
+        if nombre not in columnas:
+            cur.execute(f"ALTER TABLE partidos ADD COLUMN {nombre} {definicion}")
+    cur.executescript(FECHAS_SQL)
+
 def ensure_schema_and_admin():
     conn = sqlite3.connect(DB_NAME)
     cur = conn.cursor()
     cur.executescript(SCHEMA_SQL)
+    _migrar_fechas(cur)
     conn.commit()
 
     # crear admin por única vez si no hay usuarios
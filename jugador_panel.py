@@ -8,7 +8,13 @@
 import streamlit as st
 import sqlite3
 from datetime import date
-import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import timeline_elo
+import stats
+import ranking
+import quimica
+import forma
 
 # Si preferís centralizar, podés reemplazar por: from database import get_connection
 def get_connection():
@@ -74,28 +80,6 @@ def _nombre_jugador(jugador_id):
         row = _row_to_dict(cur.fetchone())
         return row["nombre"] if row else None
 
-def _nombre_cancha(cancha_id):
-    if cancha_id is None:
-        return "Sin asignar"
-    with get_connection() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT nombre FROM canchas WHERE id = ?", (cancha_id,))
-        row = _row_to_dict(cur.fetchone())
-        return row["nombre"] if row else "Sin asignar"
-
-def _jugadores_en_partido(partido_id):
-    """Devuelve lista de dicts: [{jugador_id, confirmado_por_jugador, nombre}, ...]"""
-    with get_connection() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT pj.jugador_id, pj.confirmado_por_jugador, j.nombre
-            FROM partido_jugadores pj
-            JOIN jugadores j ON j.id = pj.jugador_id
-            WHERE pj.partido_id = ?
-            ORDER BY j.nombre ASC
-        """, (partido_id,))
-        return _rows_to_dicts(cur.fetchall())
-
 def _existe_inscripcion(partido_id, jugador_id):
     with get_connection() as conn:
         cur = conn.cursor()
@@ -117,6 +101,7 @@ def _insertar_confirmacion(partido_id, jugador_id):
             VALUES (?, ?, 1, 'clara')
         """, (partido_id, jugador_id))
         conn.commit()
+    _cartelera.clear()
     return True, "Confirmaste tu asistencia 🟢"
 
 def _cancelar_confirmacion(partido_id, jugador_id):
@@ -127,83 +112,116 @@ def _cancelar_confirmacion(partido_id, jugador_id):
         cur.execute("DELETE FROM partido_jugadores WHERE partido_id = ? AND jugador_id = ?",
                     (partido_id, jugador_id))
         conn.commit()
+    _cartelera.clear()
     return True, "Cancelaste tu asistencia."
 
-def _partidos_abiertos_o_futuros():
-    """Lista de dicts [{id, fecha, cancha_id, tipo}, ...]"""
-    hoy = _today_str()
+# Partidos desde hoy con cancha e inscriptos en UNA consulta (una fila por inscripción)
+SQL_CARTELERA = """
+SELECT p.id, p.fecha, p.cancha_id, COALESCE(c.nombre, 'Sin asignar') AS cancha, p.tipo,
+       pj.jugador_id, pj.confirmado_por_jugador, j.nombre
+  FROM partidos p
+  LEFT JOIN canchas c ON c.id = p.cancha_id
+  LEFT JOIN partido_jugadores pj ON pj.partido_id = p.id
+  LEFT JOIN jugadores j ON j.id = pj.jugador_id
+ WHERE p.fecha_iso >= ?
+ ORDER BY p.fecha_iso ASC, p.id ASC, j.nombre ASC
+"""
+
+CARTELERA_TTL = 30  # segundos; compartida entre sesiones (todos leen lo mismo al anunciar un partido)
+
+@st.cache_data(ttl=CARTELERA_TTL, show_spinner=False)
+def _cartelera(hoy):
+    """Partidos desde `hoy` agrupados en memoria: [{id, fecha, cancha_id, cancha, tipo, jugadores}, ...]."""
     with get_connection() as conn:
         cur = conn.cursor()
-        cur.execute("""
-            SELECT id, fecha, cancha_id, tipo
-            FROM partidos
-            WHERE tipo = 'abierto' AND fecha >= ?
-            ORDER BY fecha ASC, id ASC
-        """, (hoy,))
-        abiertos = _rows_to_dicts(cur.fetchall())
-        if abiertos:
-            return abiertos
-        cur.execute("""
-            SELECT id, fecha, cancha_id, tipo
-            FROM partidos
-            WHERE fecha >= ?
-            ORDER BY fecha ASC, id ASC
-        """, (hoy,))
-        return _rows_to_dicts(cur.fetchall())
+        cur.execute(SQL_CARTELERA, (hoy,))
+        rows = _rows_to_dicts(cur.fetchall())
+    partidos = {}
+    for r in rows:
+        p = partidos.setdefault(r["id"], dict({k: r[k] for k in ("id", "fecha", "cancha_id", "cancha", "tipo")},
+                                              jugadores=[]))
+        if r["jugador_id"] is not None:
+            p["jugadores"].append({k: r[k] for k in ("jugador_id", "confirmado_por_jugador", "nombre")})
+    return list(partidos.values())
+
+def _partidos_abiertos_o_futuros():
+    """Partidos abiertos desde hoy (o, si no hay, todos los futuros), cada uno con 'cancha' y 'jugadores'."""
+    partidos = _cartelera(_today_str())
+    return [p for p in partidos if p["tipo"] == "abierto"] or partidos
+
+# Partidos del jugador con cancha y resultado desde su lado, en un solo join
+SQL_PARTIDOS_JUGADOR = """
+SELECT p.id, p.fecha, p.cancha_id, COALESCE(c.nombre, 'Sin asignar') AS cancha,
+       p.ganador, p.diferencia_gol, p.es_oficial, pj.equipo,
+       CASE WHEN p.ganador IS NULL AND p.diferencia_gol IS NULL THEN NULL
+            WHEN COALESCE(p.ganador, 0) = 0 THEN 'empate'
+            WHEN pj.equipo IS NULL THEN 'sin equipo asignado'
+            WHEN p.ganador = pj.equipo THEN 'victoria'
+            ELSE 'derrota' END AS resultado
+  FROM partido_jugadores pj
+  JOIN partidos p ON p.id = pj.partido_id
+  LEFT JOIN canchas c ON c.id = p.cancha_id
+ WHERE pj.jugador_id = ?
+ ORDER BY p.fecha_iso ASC, p.id ASC
+"""
 
 def _stats_por_sql(jugador_id):
-    """Devuelve dict con jugados, w, d, l, winrate y lista 'partidos' (dicts)."""
+    """Devuelve dict con jugados, w, d, l, winrate y lista 'partidos' (dicts, con 'cancha' y 'resultado')."""
     with get_connection() as conn:
         cur = conn.cursor()
-        cur.execute("""
-            SELECT p.id, p.fecha, p.cancha_id, p.ganador, p.diferencia_gol
-            FROM partidos p
-            JOIN partido_jugadores pj ON pj.partido_id = p.id
-            WHERE pj.jugador_id = ?
-            ORDER BY p.fecha ASC, p.id ASC
-        """, (jugador_id,))
+        cur.execute(SQL_PARTIDOS_JUGADOR, (jugador_id,))
         rows = _rows_to_dicts(cur.fetchall())
 
-        jugados = len(rows)
-        w = d = l = 0
-
-        for r in rows:
-            pid = r["id"]
-            ganador = r["ganador"]  # 0=empate, 1/2=ganador, None=pte
-            if ganador is None:
-                continue
-            cur.execute("""
-                SELECT equipo
-                FROM partido_jugadores
-                WHERE partido_id = ? AND jugador_id = ?
-                LIMIT 1
-            """, (pid, jugador_id))
-            eq_row = _row_to_dict(cur.fetchone())
-            equipo = eq_row["equipo"] if eq_row and eq_row["equipo"] in (1, 2) else None
-            if equipo is None:
-                continue
-            if ganador == 0:
-                d += 1
-            elif ganador == equipo:
-                w += 1
-            else:
-                l += 1
-
-        winrate = (w / (w + l)) * 100 if (w + l) > 0 else 0.0
-        return {"jugados": jugados, "w": w, "d": d, "l": l, "winrate": winrate, "partidos": rows}
-
-def _elo_history_sql(jugador_id):
-    """Lista de dicts [{fecha, elo_antes, elo_despues}, ...]"""
+    # W/D/L y racha: lectura por PK del agregado jugador_stats
+    fila = stats.fila_jugador(jugador_id) or {}
+    w, d, l = fila.get("victorias", 0), fila.get("empates", 0), fila.get("derrotas", 0)
+
+    winrate = (w / (w + l)) * 100 if (w + l) > 0 else 0.0
+    return {"jugados": len(rows), "w": w, "d": d, "l": l, "winrate": winrate,
+            "racha": fila.get("racha", 0), "partidos": rows}
+
+MAX_PUNTOS_GRAFICO = 300
+
+def _lttb(x, y, n):
+    """
+    Largest-Triangle-Three-Buckets: índices de n puntos que conservan la forma de la serie
+    (primero y último siempre; en cada bucket, el punto de mayor triángulo con el elegido
+    anterior y el promedio del bucket siguiente).
+    """
+    largo = len(x)
+    if n >= largo or n < 3:
+        return np.arange(largo)
+    bordes = np.linspace(1, largo - 1, n - 1).astype(int)  # n-2 buckets interiores
+    elegidos = [0]
+    for b in range(n - 2):
+        ini, fin = bordes[b], bordes[b + 1]
+        sig_ini, sig_fin = fin, (bordes[b + 2] if b + 2 < len(bordes) else largo)
+        cx, cy = x[sig_ini:sig_fin].mean(), y[sig_ini:sig_fin].mean()
+        ax, ay = x[elegidos[-1]], y[elegidos[-1]]
+        areas = np.abs((ax - cx) * (y[ini:fin] - ay) - (ax - x[ini:fin]) * (cy - ay))
+        elegidos.append(ini + int(areas.argmax()))
+    elegidos.append(largo - 1)
+    return np.array(elegidos)
+
+def _version_historial(jugador_id):
+    """(último id, cantidad) del historial del jugador: cambia al registrar o deshacer (índice jugador_id, id)."""
     with get_connection() as conn:
         cur = conn.cursor()
-        cur.execute("""
-            SELECT p.fecha AS fecha, h.elo_antes, h.elo_despues
-            FROM historial_elo h
-            JOIN partidos p ON p.id = h.partido_id
-            WHERE h.jugador_id = ?
-            ORDER BY p.fecha ASC, p.id ASC
-        """, (jugador_id,))
-        return _rows_to_dicts(cur.fetchall())
+        cur.execute("SELECT MAX(id), COUNT(*) FROM historial_elo WHERE jugador_id = ?", (jugador_id,))
+        return tuple(cur.fetchone())
+
+@st.cache_data(show_spinner=False, max_entries=500)
+def _serie_elo(jugador_id, version, max_puntos=MAX_PUNTOS_GRAFICO):
+    """DataFrame (fecha, ELO) reducido con LTTB; la clave incluye `version`, así no hace falta invalidar."""
+    filas = timeline_elo.historial_jugador(jugador_id)
+    if not filas:
+        return pd.DataFrame(columns=["fecha", "ELO"])
+    elos = np.array([elo if elo is not None else antes for _, _, antes, elo in filas], dtype=float)
+    idx = _lttb(np.arange(len(elos), dtype=float), elos, max_puntos)  # x = orden de partido
+    return pd.DataFrame({
+        "fecha": pd.to_datetime([filas[i][0] for i in idx], errors="coerce"),
+        "ELO": elos[idx],
+    })
 
 # -------------------------
 # Vistas del panel jugador
@@ -225,7 +243,7 @@ def panel_menu_jugador(user):
 
     st.header(f"Bienvenido, {nombre_para_saludo} 👋")
 
-    c1, c2 = st.columns(2)
+    c1, c2, c3, c4 = st.columns(4)
     with c1:
         if st.button("Ver partidos disponibles ⚽", key="btn_partidos_disponibles"):
             st.session_state["jugador_page"] = "partidos"
@@ -234,6 +252,14 @@ def panel_menu_jugador(user):
         if st.button("Ver mis estadísticas 📊", key="btn_mis_stats"):
             st.session_state["jugador_page"] = "stats"
             st.rerun()
+    with c3:
+        if st.button("Ver ranking 🏆", key="btn_ranking"):
+            st.session_state["jugador_page"] = "ranking"
+            st.rerun()
+    with c4:
+        if st.button("Comparar con otro jugador 🤝", key="btn_comparar"):
+            st.session_state["jugador_page"] = "comparar"
+            st.rerun()
 
 def panel_partidos_disponibles(user):
     _render_flash()
@@ -256,10 +282,9 @@ def panel_partidos_disponibles(user):
         for p in partidos:
             partido_id = p["id"]
             fecha = p["fecha"]
-            cancha_name = _nombre_cancha(p["cancha_id"])
             tipo = p["tipo"]
-            with st.expander(f"{fecha} • {cancha_name} • ({tipo})", expanded=False):
-                jugadores = _jugadores_en_partido(partido_id)
+            with st.expander(f"{fecha} • {p['cancha']} • ({tipo})", expanded=False):
+                jugadores = p["jugadores"]
                 if jugadores:
                     st.write("**Inscripciones:**")
                     for j in jugadores:
@@ -310,8 +335,8 @@ def panel_mis_estadisticas(user):
 
     st.subheader("Mis estadísticas")
 
-    stats = _stats_por_sql(jugador_id)
-    jugados, w, d, l, winrate = stats["jugados"], stats["w"], stats["d"], stats["l"], stats["winrate"]
+    resumen = _stats_por_sql(jugador_id)
+    jugados, w, d, l, winrate = resumen["jugados"], resumen["w"], resumen["d"], resumen["l"], resumen["winrate"]
 
     m1, m2, m3, m4, m5 = st.columns(5)
     m1.metric("Jugados", jugados)
@@ -319,40 +344,38 @@ def panel_mis_estadisticas(user):
     m3.metric("Empates", d)
     m4.metric("Derrotas", l)
     m5.metric("Winrate %", f"{winrate:.1f}")
+    if resumen["racha"]:
+        tipo = "victorias" if resumen["racha"] > 0 else "derrotas"
+        st.caption(f"Racha actual: {abs(resumen['racha'])} {tipo} seguidas")
+
+    st.write("")
+    st.write("### Forma reciente (oficiales)")
+    f1, f2 = st.columns(2)
+    for col, ventana in ((f1, 5), (f2, 10)):
+        f = forma.forma_de([jugador_id], ventana)[jugador_id]
+        col.markdown(f"**Últimos {ventana}** ({f['partidos']} jugados)")
+        col.write(f"Puntos: {f['puntos']} · ΔELO: {f['delta_elo']:+.1f} · Dif. gol: {f['dif_gol']:+d}")
 
     st.write("")
     st.write("### Partidos (con resultado si está cargado)")
-    if stats["partidos"]:
-        for r in stats["partidos"]:
-            fecha = r["fecha"]
-            cancha = _nombre_cancha(r["cancha_id"])
-            ganador = r["ganador"]
+    if resumen["partidos"]:
+        for r in resumen["partidos"]:
             dif = r["diferencia_gol"]
-            linea = f"• {fecha} • {cancha}"
-            if ganador is None:
+            linea = f"• {r['fecha']} • {r['cancha']}"
+            if r["resultado"] is None:
                 linea += " — resultado: _pendiente_"
             else:
-                res = "empate" if ganador == 0 else f"ganador equipo {ganador}"
-                suf = f" (dif: {dif})" if dif is not None else ""
-                linea += f" — resultado: **{res}**{suf}"
+                suf = f" (dif: {abs(dif)})" if dif is not None else ""
+                linea += f" — resultado: **{r['resultado']}**{suf}"
             st.write(linea)
     else:
         st.info("No se encontraron partidos asociados a tu jugador.")
 
     st.write("")
     st.write("### Evolución de ELO")
-    elo_hist = _elo_history_sql(jugador_id)
-    if elo_hist:
-        fechas = [row["fecha"] for row in elo_hist]
-        elos = [row["elo_despues"] if row["elo_despues"] is not None else row["elo_antes"] for row in elo_hist]
-        fig = plt.figure()
-        plt.plot(fechas, elos, marker="o")
-        plt.xticks(rotation=45, ha="right")
-        plt.xlabel("Fecha")
-        plt.ylabel("ELO")
-        plt.title("Evolución del ELO")
-        plt.tight_layout()
-        st.pyplot(fig)
+    serie = _serie_elo(jugador_id, _version_historial(jugador_id))
+    if not serie.empty:
+        st.line_chart(serie, x="fecha", y="ELO")
     else:
         st.info("Aún no hay historial de ELO para graficar.")
 
@@ -360,3 +383,99 @@ def panel_mis_estadisticas(user):
     if st.button("⬅️ Volver", key="back_stats"):
         st.session_state["jugador_page"] = "menu"
         st.rerun()
+
+def _grupos():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, nombre FROM grupos ORDER BY nombre")
+        return [(r[0], r[1]) for r in cur.fetchall()]
+
+def _tabla_ranking(filas, jugador_id=None):
+    df = pd.DataFrame(filas, columns=["Pos", "jugador_id", "Jugador", "ELO"])
+    if jugador_id is not None:
+        df["Jugador"] = [f"➡️ {n}" if jid == jugador_id else n for jid, n in zip(df["jugador_id"], df["Jugador"])]
+    df["ELO"] = df["ELO"].round(0).astype(int)
+    return df.drop(columns="jugador_id")
+
+def panel_ranking(user):
+    user = _asdict_user(user)
+    jugador_id = user.get("jugador_id")
+
+    st.subheader("Ranking 🏆")
+
+    c1, c2, c3 = st.columns(3)
+    solo_activos = c1.checkbox("Solo activos", value=True, key="rk_activos")
+    solo_oficiales = c2.checkbox("Solo con oficiales", value=False, key="rk_oficiales")
+    grupos = _grupos()
+    grupo_sel = c3.selectbox("Grupo", ["Todos"] + [g[1] for g in grupos], key="rk_grupo")
+    grupo_id = next((g[0] for g in grupos if g[1] == grupo_sel), None)
+    filtro = {"solo_activos": solo_activos, "solo_oficiales": solo_oficiales, "grupo_id": grupo_id}
+
+    if jugador_id:
+        pos = ranking.posicion(jugador_id, **filtro)
+        if pos:
+            st.metric("Tu posición", f"{pos[0]} de {pos[1]}")
+            st.write("### Cerca tuyo")
+            st.dataframe(_tabla_ranking(ranking.alrededor(jugador_id, radio=3, **filtro), jugador_id),
+                         hide_index=True, use_container_width=True)
+        else:
+            st.info("No aparecés en el ranking con estos filtros.")
+
+    st.write("### Top 10")
+    top = ranking.top(10, **filtro)
+    if top:
+        st.dataframe(_tabla_ranking(top, jugador_id), hide_index=True, use_container_width=True)
+    else:
+        st.info("No hay jugadores para estos filtros.")
+
+    st.divider()
+    if st.button("⬅️ Volver", key="back_ranking"):
+        st.session_state["jugador_page"] = "menu"
+        st.rerun()
+
+def _nombres_jugadores():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, nombre FROM jugadores ORDER BY nombre")
+        return {r[0]: r[1] for r in cur.fetchall()}
+
+def _texto_registro(r):
+    if not r["jugados"]:
+        return "sin partidos"
+    return f"{r['victorias']}G · {r['empates']}E · {r['derrotas']}P ({r['jugados']} partidos)"
+
+def panel_comparar(user):
+    user = _asdict_user(user)
+    jugador_id = user.get("jugador_id")
+    if not jugador_id:
+        st.warning("Tu usuario no está vinculado a ningún jugador.")
+        if st.button("⬅️ Volver", key="back_comparar_sin_vinculo"):
+            st.session_state["jugador_page"] = "menu"
+            st.rerun()
+        return
+
+    st.subheader("Cara a cara 🤝")
+    nombres = _nombres_jugadores()
+    otros = [jid for jid in nombres if jid != jugador_id]
+    if otros:
+        otro = st.selectbox("Jugador", otros, format_func=lambda j: nombres[j], key="sb_comparar")
+        juntos = quimica.registro_companeros(jugador_id, otro)
+        contra = quimica.registro_rivales(jugador_id, otro)
+        c1, c2 = st.columns(2)
+        c1.markdown(f"**Juntos:** {_texto_registro(juntos)}")
+        c2.markdown(f"**En contra:** {_texto_registro(contra)}")
+
+    st.write("### Con quién te va mejor")
+    filas = [(nombres.get(jid, f"#{jid}"), r["jugados"], r["victorias"], r["empates"], r["derrotas"],
+              round(r["victorias"] / r["jugados"] * 100, 1))
+             for jid, r in quimica.companeros_de(jugador_id, minimo=2)]
+    if filas:
+        st.dataframe(pd.DataFrame(filas, columns=["Compañero", "PJ", "G", "E", "P", "Winrate %"]),
+                     hide_index=True, use_container_width=True)
+    else:
+        st.info("Todavía no hay suficientes partidos juntos (mínimo 2).")
+
+    st.divider()
+    if st.button("⬅️ Volver", key="back_comparar"):
+        st.session_state["jugador_page"] = "menu"
+        st.rerun()
@@ -1,5 +1,7 @@
 import streamlit as st
 import sqlite3
+import decaimiento_elo
+import ranking
 
 DB_NAME = "elo_futbol.db"
 
@@ -39,6 +41,8 @@ def panel_gestion():
                         (nombre, elo_inicial, estado),
                     )
                     conn.commit()
+                    decaimiento_elo.invalidar()
+                    ranking.invalidar()
                     st.success(f"Jugador {nombre} creado con éxito ✅.")
                 conn.close()
 
@@ -60,6 +64,8 @@ def panel_gestion():
                 cur = conn.cursor()
                 cur.execute("DELETE FROM jugadores WHERE id = ?", (jugador_id,))
                 conn.commit()
+                decaimiento_elo.invalidar()
+                ranking.invalidar()
                 conn.close()
                 st.success(f"Jugador {jugador_sel} eliminado ❌.")
         else:
@@ -109,6 +115,8 @@ def panel_gestion():
                         (nuevo_nombre, nuevo_elo, nuevo_estado, jugador_id),
                     )
                     conn.commit()
+                    decaimiento_elo.invalidar()
+                    ranking.invalidar()
                     st.success(f"Jugador {nuevo_nombre} actualizado ✏️.")
                 conn.close()
         else:
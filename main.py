@@ -1,8 +1,14 @@
 import streamlit as st
 from auth import verify_user
 from init_db import ensure_schema_and_admin  # ← agregar
+from timeline_elo import asegurar_timeline
+from stats import asegurar_jugador_stats
+from forma import asegurar_forma
 
 ensure_schema_and_admin()  # ← inicializa tablas y admin si falta
+asegurar_timeline()        # ← backfill de la línea de tiempo de ELO (una vez por proceso)
+asegurar_jugador_stats()   # ← backfill del agregado por jugador (si está vacío)
+asegurar_forma()           # ← backfill de la forma reciente (si está vacía)
 
 st.title("Topo Partidos ⚽")
 
@@ -97,6 +103,10 @@ else:
             jugador_panel.panel_partidos_disponibles(user)
         elif st.session_state.jugador_page == "stats":
             jugador_panel.panel_mis_estadisticas(user)
+        elif st.session_state.jugador_page == "ranking":
+            jugador_panel.panel_ranking(user)
+        elif st.session_state.jugador_page == "comparar":
+            jugador_panel.panel_comparar(user)
         else:
             st.session_state.jugador_page = "menu"
             st.rerun()
@@ -0,0 +1,233 @@
+# prediccion.py
+# Predictor de resultado (gana E1 / empate / gana E2) para cualquier par de equipos.
+# Modelo logístico ordinal sobre la diferencia de ELO promedio:
+#     z = a * (elo1 - elo2) / 400 + b         (b = ventaja del equipo 1)
+#     P(E1) = σ(z - θ)    P(E2) = σ(-z - θ)    P(empate) = 1 - P(E1) - P(E2)
+# Se calibra con los oficiales de `partidos` + `partido_jugadores` (ELO previo desde historial_elo),
+# regularizado hacia el ELO clásico (a = ln 10, b = 0) para que con poca historia se comporte igual.
+# Los parámetros se guardan en `modelo_prediccion` y se actualizan con un paso de Newton online por
+# resultado (información observada acumulada, aproximación de Laplace); cada REAJUSTE_CADA pasos se
+# rehace el ajuste completo para que el error del online quede acotado.
+
+from datetime import datetime
+import threading
+import numpy as np
+from database import get_connection
+
+ESCALA = 400.0
+PRIOR = np.array([np.log(10.0), 0.0, np.log(0.15)])  # a, b, log(θ)
+LAMBDA_PRIOR = 5.0    # peso del prior, en "partidos equivalentes"
+ITER_AJUSTE = 400
+LR_AJUSTE = 0.5
+ITER_NEWTON = 20
+REAJUSTE_CADA = 50    # pasos online entre ajustes completos
+
+_lock = threading.Lock()
+_modelo = None  # {"params": np.ndarray(3), "n": int, "info": np.ndarray(3×3) | None, "pasos": int}
+
+def _sigmoid(u):
+    return 1.0 / (1.0 + np.exp(-u))
+
+# -------------------------
+# Núcleo vectorizado
+# -------------------------
+def _probs_params(params, x):
+    a, b, t = params
+    z = a * np.asarray(x, dtype=float) + b
+    th = np.exp(t)
+    p1 = _sigmoid(z - th)
+    p2 = _sigmoid(-z - th)
+    return p1, np.clip(1.0 - p1 - p2, 0.0, 1.0), p2
+
+def _gradiente(params, x, y):
+    """Gradiente de la log-verosimilitud total. y: 2 = gana E1, 1 = empate, 0 = gana E2."""
+    a, b, t = params
+    z = a * x + b
+    th = np.exp(t)
+    g_z = np.zeros_like(x)
+    g_th = np.zeros_like(x)
+
+    gana1 = y == 2
+    s = _sigmoid(z[gana1] - th)
+    g_z[gana1] = 1.0 - s
+    g_th[gana1] = -(1.0 - s)
+
+    gana2 = y == 0
+    s = _sigmoid(-z[gana2] - th)
+    g_z[gana2] = -(1.0 - s)
+    g_th[gana2] = -(1.0 - s)
+
+    emp = y == 1
+    A = _sigmoid(th - z[emp])
+    B = _sigmoid(-th - z[emp])
+    den = np.maximum(A - B, 1e-12)
+    g_z[emp] = (-A * (1 - A) + B * (1 - B)) / den
+    g_th[emp] = (A * (1 - A) + B * (1 - B)) / den
+
+    return np.array([np.sum(g_z * x), np.sum(g_z), np.sum(g_th) * th])
+
+def _logver(params, x, y):
+    """Log-verosimilitud penalizada (con el prior) de todo el lote."""
+    p1, pe, p2 = _probs_params(params, x)
+    p = np.where(y == 2, p1, np.where(y == 0, p2, pe))
+    return np.sum(np.log(np.maximum(p, 1e-12))) - 0.5 * LAMBDA_PRIOR * np.sum((params - PRIOR) ** 2)
+
+def _hessiano(params, x, y, h=1e-5):
+    """Hessiano de la log-verosimilitud (sin prior) por diferencias centrales del gradiente analítico."""
+    H = np.zeros((3, 3))
+    for j in range(3):
+        e = np.zeros(3)
+        e[j] = h
+        H[:, j] = (_gradiente(params + e, x, y) - _gradiente(params - e, x, y)) / (2 * h)
+    return 0.5 * (H + H.T)
+
+def _informacion(params, x, y):
+    """Información observada de la posterior: -Hessiano de la log-verosimilitud + λ·I del prior."""
+    return -_hessiano(params, x, y) + LAMBDA_PRIOR * np.eye(3)
+
+def _ajustar_params(x, y, inicio=None, iteraciones=ITER_AJUSTE):
+    """
+    MAP con prior gaussiano hacia PRIOR: ascenso de gradiente (batch, vectorizado) para acercarse
+    y pasos de Newton amortiguados para converger al óptimo.
+    """
+    params = np.array(PRIOR if inicio is None else inicio, dtype=float)
+    n = len(x)
+    for _ in range(iteraciones):
+        g = _gradiente(params, x, y) - LAMBDA_PRIOR * (params - PRIOR)
+        params = params + LR_AJUSTE * g / (n + LAMBDA_PRIOR)
+    actual = _logver(params, x, y)
+    for _ in range(ITER_NEWTON):
+        g = _gradiente(params, x, y) - LAMBDA_PRIOR * (params - PRIOR)
+        paso = np.linalg.solve(_informacion(params, x, y), g)
+        t = 1.0
+        while t > 1e-4 and _logver(params + t * paso, x, y) < actual:
+            t *= 0.5
+        if t <= 1e-4:
+            break
+        params = params + t * paso
+        actual = _logver(params, x, y)
+        if np.max(np.abs(t * paso)) < 1e-8:
+            break
+    return params
+
+def _paso_online(params, info, x, y):
+    """
+    Un paso de Newton con resultados nuevos (x, y): la información acumulada de la historia
+    (`info`, evaluada en el óptimo previo) más la de los nuevos; params += info⁻¹ · g_nuevos.
+    Devuelve (params, info).
+    """
+    info = info + (-_hessiano(params, x, y))
+    params = params + np.linalg.solve(info, _gradiente(params, x, y))
+    return params, info
+
+# -------------------------
+# Datos
+# -------------------------
+SQL_DATOS = """
+SELECT p.id AS partido_id,
+       p.ganador,
+       AVG(CASE WHEN pj.equipo = 1 THEN he.elo_antes END) AS elo1,
+       AVG(CASE WHEN pj.equipo = 2 THEN he.elo_antes END) AS elo2
+  FROM partidos p
+  JOIN partido_jugadores pj ON pj.partido_id = p.id AND pj.equipo IN (1, 2)
+  JOIN historial_elo he ON he.partido_id = p.id AND he.jugador_id = pj.jugador_id
+ WHERE p.es_oficial = 1
+   AND (p.ganador IS NOT NULL OR p.diferencia_gol IS NOT NULL)
+   {filtro}
+ GROUP BY p.id
+HAVING elo1 IS NOT NULL AND elo2 IS NOT NULL
+"""
+
+def _cargar_datos(partido_id=None):
+    """(x, y) vectorizados; x = (elo1 - elo2) / ESCALA, y en {0,1,2}."""
+    filtro, params = ("AND p.id = ?", (partido_id,)) if partido_id is not None else ("", ())
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_DATOS.format(filtro=filtro), params)
+        rows = [tuple(r) for r in cur.fetchall()]
+    if not rows:
+        return np.zeros(0), np.zeros(0, dtype=int)
+    arr = np.array([(r[1] if r[1] is not None else 0, r[2], r[3]) for r in rows], dtype=float)
+    x = (arr[:, 1] - arr[:, 2]) / ESCALA
+    y = np.where(arr[:, 0] == 1, 2, np.where(arr[:, 0] == 2, 0, 1))
+    return x, y
+
+# -------------------------
+# Persistencia / cache
+# -------------------------
+def _guardar(params, n):
+    with get_connection() as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO modelo_prediccion (id, a, b, log_theta, n, actualizado)
+            VALUES (1, ?, ?, ?, ?, ?)
+        """, (float(params[0]), float(params[1]), float(params[2]), int(n), datetime.now().isoformat()))
+        conn.commit()
+
+def ajustar():
+    """Ajuste completo desde la historia (al inicio, tras deshacer y cada REAJUSTE_CADA pasos online)."""
+    global _modelo
+    x, y = _cargar_datos()
+    params = _ajustar_params(x, y)
+    with _lock:
+        _modelo = {"params": params, "n": len(x), "info": _informacion(params, x, y), "pasos": 0}
+    _guardar(params, len(x))
+    return _modelo
+
+def modelo():
+    """Parámetros vigentes: memoria -> tabla -> ajuste completo."""
+    global _modelo
+    if _modelo is not None:
+        return _modelo
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT a, b, log_theta, n FROM modelo_prediccion WHERE id = 1")
+        row = cur.fetchone()
+    if row is None:
+        return ajustar()
+    with _lock:
+        # La información no se guarda: el primer resultado tras un reinicio hace el ajuste completo
+        _modelo = {"params": np.array([row[0], row[1], row[2]], dtype=float), "n": int(row[3]),
+                   "info": None, "pasos": 0}
+    return _modelo
+
+def actualizar_con_partido(partido_id: int):
+    """Refit incremental: paso de Newton con el nuevo resultado (ajuste completo cada REAJUSTE_CADA)."""
+    global _modelo
+    x, y = _cargar_datos(partido_id)
+    if len(x) == 0:
+        return modelo()
+    actual = modelo()
+    # Sin información en memoria (modelo leído de la tabla) o tras REAJUSTE_CADA pasos: ajuste completo
+    if actual["info"] is None or actual["pasos"] + 1 >= REAJUSTE_CADA:
+        return ajustar()
+    params, info = _paso_online(actual["params"], actual["info"], x, y)
+    n = actual["n"] + len(x)
+    with _lock:
+        _modelo = {"params": params, "n": n, "info": info, "pasos": actual["pasos"] + 1}
+    _guardar(params, n)
+    return _modelo
+
+def invalidar():
+    """Descarta el modelo (p. ej. al deshacer un resultado); se reajusta en el próximo uso."""
+    global _modelo
+    with _lock:
+        _modelo = None
+    with get_connection() as conn:
+        conn.execute("DELETE FROM modelo_prediccion")
+        conn.commit()
+
+# -------------------------
+# API de predicción
+# -------------------------
+def probabilidades(elo1, elo2):
+    """
+    P(gana E1), P(empate), P(gana E2) para ELOs promedio de equipo (escalares o arrays).
+    Vectorizado: puntuar cientos de particiones es una sola operación.
+    """
+    x = (np.asarray(elo1, dtype=float) - np.asarray(elo2, dtype=float)) / ESCALA
+    return _probs_params(modelo()["params"], x)
+
+def probabilidades_equipos(elos_e1, elos_e2):
+    """Atajo para dos listas de ELOs individuales (cualquier tamaño de equipo)."""
+    p1, pe, p2 = probabilidades(np.mean(elos_e1), np.mean(elos_e2))
+    return float(p1), float(pe), float(p2)
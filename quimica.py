@@ -0,0 +1,146 @@
+# quimica.py
+# Cara a cara y "química" entre jugadores, con matrices dispersas (scipy.sparse).
+# Con las matrices de incidencia partido × jugador de cada equipo (A1, A2) y el resultado
+# de cada partido, todos los pares salen de productos dispersos:
+#   compañeros ganados   = A1ᵀ·G1·A1 + A2ᵀ·G2·A2      (Gk = diag(ganó el equipo k))
+#   rival i le ganó a j  = A1ᵀ·G1·A2 + A2ᵀ·G2·A1      (perdidos = la transpuesta)
+# Las matrices quedan en formato DOK: consulta de un par en O(1) y suma incremental
+# al registrar un resultado, sin self-join por request. Undo -> invalidar() (se rearma con un join).
+
+import threading
+import numpy as np
+import scipy.sparse as sp
+from database import get_connection
+
+SQL_PARTICIPACIONES = """
+SELECT p.id AS partido_id, COALESCE(p.ganador, 0) AS ganador, pj.jugador_id, pj.equipo
+  FROM partidos p
+  JOIN partido_jugadores pj ON pj.partido_id = p.id AND pj.equipo IN (1, 2)
+ WHERE (p.ganador IS NOT NULL OR p.diferencia_gol IS NOT NULL)
+   {filtro}
+"""
+
+_lock = threading.Lock()
+_estado = None  # dict con "indice" {jugador_id: fila} y las matrices DOK
+
+MATRICES = ("comp_v", "comp_e", "comp_d", "riv_v", "riv_e")
+
+def _cargar(partido_id=None):
+    filtro, params = ("AND p.id = ?", (partido_id,)) if partido_id is not None else ("", ())
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_PARTICIPACIONES.format(filtro=filtro), params)
+        rows = [tuple(r) for r in cur.fetchall()]
+    return np.array(rows, dtype=np.int64).reshape(-1, 4)
+
+def _productos(arr, indice, n):
+    """Matrices (n × n) de un bloque de participaciones, con productos dispersos."""
+    partidos, fila_partido = np.unique(arr[:, 0], return_inverse=True)
+    cols = np.array([indice[j] for j in arr[:, 2]], dtype=np.int64)
+    equipo = arr[:, 3]
+    ganador = np.zeros(len(partidos), dtype=np.int64)
+    ganador[fila_partido] = arr[:, 1]
+
+    def incidencia(k):
+        m = equipo == k
+        return sp.csr_matrix((np.ones(m.sum()), (fila_partido[m], cols[m])), shape=(len(partidos), n))
+
+    A1, A2 = incidencia(1), incidencia(2)
+    G1, G2, E = (sp.diags((ganador == g).astype(float)) for g in (1, 2, 0))
+    out = {
+        "comp_v": A1.T @ G1 @ A1 + A2.T @ G2 @ A2,
+        "comp_e": A1.T @ E @ A1 + A2.T @ E @ A2,
+        "comp_d": A1.T @ G2 @ A1 + A2.T @ G1 @ A2,
+        "riv_v": A1.T @ G1 @ A2 + A2.T @ G2 @ A1,
+        "riv_e": A1.T @ E @ A2 + A2.T @ E @ A1,
+    }
+    for m in ("comp_v", "comp_e", "comp_d"):
+        out[m].setdiag(0)  # uno mismo no es compañero
+    return out
+
+def _construir():
+    arr = _cargar()
+    ids = np.unique(arr[:, 2]) if len(arr) else np.zeros(0, dtype=np.int64)
+    indice = {int(j): i for i, j in enumerate(ids)}
+    mats = _productos(arr, indice, len(indice)) if len(arr) else \
+        {m: sp.csr_matrix((0, 0)) for m in MATRICES}
+    return {"indice": indice, **{m: mats[m].todok() for m in MATRICES}}
+
+def _actual():
+    """Estado vigente (se arma la primera vez). Llamar con _lock tomado."""
+    global _estado
+    if _estado is None:
+        _estado = _construir()
+    return _estado
+
+# -------------------------
+# Mantenimiento
+# -------------------------
+def agregar_partido(partido_id: int):
+    """Suma el resultado recién registrado a las matrices (sólo toca los pares del partido)."""
+    arr = _cargar(partido_id)
+    if not len(arr):
+        return
+    with _lock:
+        if _estado is None:
+            return  # se arma completo en el próximo uso
+        indice = _estado["indice"]
+        for j in arr[:, 2]:
+            indice.setdefault(int(j), len(indice))
+        n = len(indice)
+        delta = _productos(arr, indice, n)
+        for m in MATRICES:
+            M = _estado[m]
+            if M.shape != (n, n):
+                M.resize((n, n))
+            coo = delta[m].tocoo()
+            for i, j, v in zip(coo.row, coo.col, coo.data):
+                if v:
+                    M[i, j] += v
+
+def invalidar():
+    global _estado
+    with _lock:
+        _estado = None
+
+# -------------------------
+# Consultas (O(1) por par)
+# -------------------------
+def _registro(v, e, d):
+    v, e, d = int(v), int(e), int(d)
+    return {"jugados": v + e + d, "victorias": v, "empates": e, "derrotas": d}
+
+def registro_companeros(a, b):
+    """Récord de a y b jugando en el mismo equipo."""
+    with _lock:
+        s = _actual()
+        i, j = s["indice"].get(a), s["indice"].get(b)
+        if i is None or j is None:
+            return _registro(0, 0, 0)
+        return _registro(s["comp_v"][i, j], s["comp_e"][i, j], s["comp_d"][i, j])
+
+def registro_rivales(a, b):
+    """Récord de a enfrentando a b (desde la perspectiva de a)."""
+    with _lock:
+        s = _actual()
+        i, j = s["indice"].get(a), s["indice"].get(b)
+        if i is None or j is None:
+            return _registro(0, 0, 0)
+        return _registro(s["riv_v"][i, j], s["riv_e"][i, j], s["riv_v"][j, i])
+
+def companeros_de(a, minimo=1):
+    """[(jugador_id, registro)] de quienes jugaron con a al menos `minimo` veces, por winrate."""
+    with _lock:
+        s = _actual()
+        i = s["indice"].get(a)
+        if i is None:
+            return []
+        inverso = {f: jid for jid, f in s["indice"].items()}
+        filas = {m: s[m].tocsr()[i] for m in ("comp_v", "comp_e", "comp_d")}
+    total = filas["comp_v"] + filas["comp_e"] + filas["comp_d"]
+    out = []
+    for j in total.indices:
+        r = _registro(filas["comp_v"][0, j], filas["comp_e"][0, j], filas["comp_d"][0, j])
+        if r["jugados"] >= minimo:
+            out.append((inverso[j], r))
+    return sorted(out, key=lambda t: (-t[1]["victorias"] / t[1]["jugados"], -t[1]["jugados"]))
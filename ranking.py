@@ -0,0 +1,124 @@
+# ranking.py
+# Tabla de posiciones incremental, compartida por todas las sesiones del proceso.
+# Por cada filtro (activos / solo con oficiales / grupo) se mantiene en memoria una lista
+# ordenada de claves (-elo, jugador_id): la posición de un jugador sale con bisect en O(log n)
+# y el top-N o la página alrededor de un jugador son slices, sin ordenar en cada request.
+# El orden usa el ELO efectivo de decaimiento_elo (el mismo que ven los equipos), así que las
+# tablas se rearman al cambiar el día. Al registrar un oficial sólo se reubican los jugadores
+# que cambiaron de ELO (recién jugaron: efectivo = guardado). Undo / ediciones -> invalidar().
+
+import bisect
+import threading
+from datetime import date
+import decaimiento_elo
+from database import get_connection
+
+_lock = threading.Lock()
+_tablas = {}  # (solo_activos, solo_oficiales, grupo_id) -> _Tabla
+_dia = None   # día de los ELO efectivos con que se armaron las tablas
+
+class _Tabla:
+    def __init__(self, filas):
+        # filas ya vienen ordenadas por elo DESC, id ASC
+        self.claves = [(-float(elo), jid) for jid, _, elo in filas]
+        self.nombres = {jid: nombre for jid, nombre, _ in filas}
+        self.elos = {jid: float(elo) for jid, _, elo in filas}
+
+    def posicion(self, jid):
+        """Posición 1-based; empates de ELO comparten posición."""
+        return bisect.bisect_left(self.claves, (-self.elos[jid],)) + 1
+
+    def indice(self, jid):
+        return bisect.bisect_left(self.claves, (-self.elos[jid], jid))
+
+    def mover(self, jid, elo):
+        del self.claves[self.indice(jid)]
+        self.elos[jid] = float(elo)
+        bisect.insort(self.claves, (-float(elo), jid))
+
+    def filas(self, desde, hasta):
+        return [(self.posicion(jid), jid, self.nombres[jid], -neg)
+                for neg, jid in self.claves[max(desde, 0):hasta]]
+
+def _clave(solo_activos=True, solo_oficiales=False, grupo_id=None):
+    return (bool(solo_activos), bool(solo_oficiales), grupo_id)
+
+def _cargar(clave):
+    solo_activos, solo_oficiales, grupo_id = clave
+    filtros, params = [], []
+    if solo_activos:
+        filtros.append("j.estado = 'activo'")
+    if solo_oficiales:
+        filtros.append("EXISTS (SELECT 1 FROM historial_elo he WHERE he.jugador_id = j.id)")
+    if grupo_id is not None:
+        filtros.append("j.grupo_id = ?")
+        params.append(grupo_id)
+    where = ("WHERE " + " AND ".join(filtros)) if filtros else ""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT j.id, j.nombre, j.elo_actual FROM jugadores j {where}", params)
+        rows = cur.fetchall()
+    efectivos = decaimiento_elo.elos_efectivos()
+    filas = [(r[0], r[1], efectivos[r[0]][0] if r[0] in efectivos else (r[2] or 0.0)) for r in rows]
+    filas.sort(key=lambda f: (-f[2], f[0]))
+    return _Tabla(filas)
+
+def _tabla(clave):
+    """Devuelve la tabla del filtro (se arma la primera vez y al cambiar el día). Llamar con _lock tomado."""
+    global _dia
+    hoy = date.today().isoformat()
+    if hoy != _dia:
+        _tablas.clear()
+        _dia = hoy
+    tabla = _tablas.get(clave)
+    if tabla is None:
+        tabla = _tablas[clave] = _cargar(clave)
+    return tabla
+
+# -------------------------
+# Consultas
+# -------------------------
+def top(n=10, **filtro):
+    """[(posicion, jugador_id, nombre, elo)] de los primeros n."""
+    with _lock:
+        return _tabla(_clave(**filtro)).filas(0, n)
+
+def posicion(jugador_id, **filtro):
+    """(posicion, total) del jugador en el filtro, o None si no entra en él."""
+    with _lock:
+        tabla = _tabla(_clave(**filtro))
+        if jugador_id not in tabla.elos:
+            return None
+        return tabla.posicion(jugador_id), len(tabla.claves)
+
+def alrededor(jugador_id, radio=5, **filtro):
+    """Página de hasta 2·radio+1 filas centrada en el jugador ([] si no entra en el filtro)."""
+    with _lock:
+        tabla = _tabla(_clave(**filtro))
+        if jugador_id not in tabla.elos:
+            return []
+        i = tabla.indice(jugador_id)
+        return tabla.filas(i - radio, i + radio + 1)
+
+# -------------------------
+# Mantenimiento
+# -------------------------
+def actualizar(cambios):
+    """
+    Reubica jugadores tras un resultado oficial. cambios: [(jugador_id, elo_nuevo)].
+    En las tablas "solo oficiales" el jugador entra si todavía no estaba (acaba de jugar uno).
+    """
+    with _lock:
+        for (solo_activos, solo_oficiales, grupo_id), tabla in list(_tablas.items()):
+            for jid, elo in cambios:
+                if jid in tabla.elos:
+                    tabla.mover(jid, elo)
+                elif solo_oficiales:
+                    # No sabemos si cumple el resto del filtro: se rearma en el próximo uso
+                    _tablas.pop((solo_activos, solo_oficiales, grupo_id), None)
+                    break
+
+def invalidar():
+    """Descarta todas las tablas (undo de resultado, alta/baja/edición de jugadores)."""
+    with _lock:
+        _tablas.clear()
@@ -0,0 +1,94 @@
+# simulador.py
+# Simulación Monte Carlo de la temporada: miles de "fechas" futuras con el pool actual.
+# Cada fecha, en cada simulación: se sortean los convocados, se arman equipos con el
+# balanceador (todas las particiones, la más cercana a 50/50 según el predictor), se sortea
+# el resultado con las probabilidades del modelo y se aplica la actualización de ELO por equipo.
+# Todo en NumPy por lotes de simulaciones, en el mismo proceso (un pool de procesos no aceleraba
+# y forkeaba el servidor de Streamlit entero); el lote acota la memoria de cada paso.
+
+import numpy as np
+import pandas as pd
+from database import get_connection
+import decaimiento_elo
+import prediccion
+import equipos
+
+PERCENTILES = (5, 25, 50, 75, 95)
+LOTE_SIM = 2000   # simulaciones por lote vectorizado
+
+def _mascara_particiones(tam_equipo):
+    """(P × 2·tam) bool: Equipo 1 de cada partición de los convocados (mismas reglas que el generador)."""
+    return equipos.particiones_validas([{"bloque": None}] * (2 * tam_equipo), tam_equipo)
+
+def _simular_lote(args):
+    """Simula `n_sim` temporadas independientes; devuelve ELOs finales (n_sim × jugadores)."""
+    elos_iniciales, params, n_sim, n_fechas, K, tam_equipo, seed = args
+    rng = np.random.default_rng(seed)
+    n_jug = len(elos_iniciales)
+    n_conv = 2 * tam_equipo
+    M = _mascara_particiones(tam_equipo).astype(float)     # (P, n_conv)
+    filas = np.arange(n_sim)
+
+    elos = np.tile(np.asarray(elos_iniciales, dtype=float), (n_sim, 1))
+    for _ in range(n_fechas):
+        # Convocados: n_conv jugadores distintos por simulación
+        conv = np.argsort(rng.random((n_sim, n_jug)), axis=1)[:, :n_conv]  # (S, n_conv)
+        e = elos[filas[:, None], conv]                                       # (S, n_conv)
+
+        # Balanceo: todas las particiones, la más cercana a 50/50
+        m1 = e @ M.T / tam_equipo                                            # (S, P)
+        m2 = (e.sum(axis=1, keepdims=True) - m1 * tam_equipo) / tam_equipo
+        p1, pe, p2 = prediccion._probs_params(params, (m1 - m2) / prediccion.ESCALA)
+        mejor = np.argmin(np.abs(p1 - p2), axis=1)
+        en1 = M[mejor].astype(bool)                                          # (S, n_conv)
+        p1, pe = p1[filas, mejor], pe[filas, mejor]
+        m1, m2 = m1[filas, mejor], m2[filas, mejor]
+
+        # Resultado sorteado con el modelo
+        u = rng.random(n_sim)
+        score1 = np.where(u < p1, 1.0, np.where(u < p1 + pe, 0.5, 0.0))
+
+        # Actualización ELO por equipo (promedio vs promedio)
+        esperado1 = 1.0 / (1.0 + 10 ** ((m2 - m1) / 400.0))
+        delta1 = K * (score1 - esperado1)
+        delta = np.where(en1, delta1[:, None], -delta1[:, None])
+        np.add.at(elos, (np.repeat(filas, n_conv), conv.ravel()), delta.ravel())
+    return elos
+
+def _pool_actual():
+    """[(jugador_id, nombre, elo_efectivo)] de los jugadores activos."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, nombre FROM jugadores WHERE estado = 'activo' ORDER BY id")
+        rows = [tuple(r) for r in cur.fetchall()]
+    efectivos = decaimiento_elo.elos_efectivos()
+    return [(jid, nombre, efectivos[jid][0]) for jid, nombre in rows if jid in efectivos]
+
+def simular_temporada(n_fechas=20, n_sim=2000, K=80, tam_equipo=5, seed=None):
+    """
+    Devuelve DataFrame por jugador con ELO actual, bandas de percentiles del ELO final,
+    posición media y probabilidad de terminar 1º.
+    """
+    pool = _pool_actual()
+    if len(pool) < 2 * tam_equipo:
+        raise ValueError(f"Se necesitan al menos {2 * tam_equipo} jugadores activos para simular.")
+
+    elos0 = np.array([p[2] for p in pool], dtype=float)
+    params = prediccion.modelo()["params"]
+    lotes = [min(LOTE_SIM, n_sim - i) for i in range(0, n_sim, LOTE_SIM)]
+    semillas = np.random.SeedSequence(seed).spawn(len(lotes))
+    finales = np.vstack([_simular_lote((elos0, params, n, n_fechas, K, tam_equipo, s))
+                         for n, s in zip(lotes, semillas)])
+
+    bandas = np.percentile(finales, PERCENTILES, axis=0)              # (len(PERCENTILES), jugadores)
+    posiciones = (-finales).argsort(axis=1).argsort(axis=1) + 1       # 1 = primero
+    df = pd.DataFrame({
+        "jugador_id": [p[0] for p in pool],
+        "jugador": [p[1] for p in pool],
+        "elo_actual": elos0.round(1),
+    })
+    for pct, fila in zip(PERCENTILES, bandas):
+        df[f"p{pct}"] = fila.round(1)
+    df["posicion_media"] = posiciones.mean(axis=0).round(2)
+    df["prob_campeon"] = (posiciones == 1).mean(axis=0).round(3)
+    return df.sort_values(["posicion_media", "p50"], ascending=[True, False]).reset_index(drop=True)
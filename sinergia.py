@@ -0,0 +1,192 @@
+# sinergia.py
+# Sinergia de duplas aprendida de la historia (modelo de interacciones por pares, ridge).
+# Para cada oficial con resultado:
+#     score1 - E1(ELO previo) ≈ Σ s_ij (pares del equipo 1) - Σ s_ij (pares del equipo 2)
+# X (partidos × pares) es dispersa (+1 / -1 por par) y se resuelve con scipy.sparse.linalg.lsqr
+# sobre el sistema aumentado [X; √λ·I] (ridge exacto).
+# Registrar/deshacer sólo sube la generación en `sinergia_estado` (no bloquea el guardado). La
+# lectura compara esa generación con la de los pares vigentes: si quedaron viejos, lanza el
+# reajuste en un hilo de fondo (desde la solución anterior, x0, acotado a ITER_MAX iteraciones) y
+# mientras tanto sigue usando los pares anteriores. Como la generación vive en la base, otro
+# proceso con pares ya cargados en memoria también se entera.
+# Los s_ij se guardan compactos en `sinergia_pares` (sólo pares no nulos, a < b).
+
+import itertools
+import threading
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import lsqr
+from database import get_connection
+
+LAMBDA = 3.0                          # regularización (en "partidos equivalentes")
+ELO_POR_PUNTO = 1600.0 / np.log(10)   # 1 punto de score esperado ≈ 695 de ELO promedio (cerca de 50/50)
+ITER_MAX = 500
+MINIMO = 1e-6
+
+SQL_DATOS = """
+SELECT p.id AS partido_id, COALESCE(p.ganador, 0) AS ganador, pj.jugador_id, pj.equipo, he.elo_antes
+  FROM partidos p
+  JOIN partido_jugadores pj ON pj.partido_id = p.id AND pj.equipo IN (1, 2)
+  JOIN historial_elo he ON he.partido_id = p.id AND he.jugador_id = pj.jugador_id
+ WHERE p.es_oficial = 1
+   AND (p.ganador IS NOT NULL OR p.diferencia_gol IS NOT NULL)
+ ORDER BY p.id
+"""
+
+_lock = threading.Lock()
+_ajuste = threading.Lock()   # un solo reajuste a la vez
+_pares = None                # {(a, b): s_ab} con a < b
+_cargada = None              # generación (sinergia_estado.ajustada) de los pares en memoria
+_hilo = None
+
+# -------------------------
+# Ajuste
+# -------------------------
+def _sistema():
+    """(X dispersa, y, [pares]) desde una consulta."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_DATOS)
+        rows = [tuple(r) for r in cur.fetchall()]
+
+    partidos = {}
+    for pid, ganador, jid, equipo, elo in rows:
+        p = partidos.setdefault(pid, {"ganador": ganador, 1: [], 2: []})
+        p[equipo].append((jid, elo))
+
+    indice, filas, cols, vals, y = {}, [], [], [], []
+    for pid, p in partidos.items():
+        if not p[1] or not p[2]:
+            continue
+        m1 = np.mean([e for _, e in p[1]])
+        m2 = np.mean([e for _, e in p[2]])
+        esperado1 = 1.0 / (1.0 + 10 ** ((m2 - m1) / 400.0))
+        score1 = {1: 1.0, 2: 0.0}.get(p["ganador"], 0.5)
+        fila = len(y)
+        y.append(score1 - esperado1)
+        for equipo, signo in ((1, 1.0), (2, -1.0)):
+            ids = sorted(j for j, _ in p[equipo])
+            for par in itertools.combinations(ids, 2):
+                filas.append(fila)
+                cols.append(indice.setdefault(par, len(indice)))
+                vals.append(signo)
+
+    X = sp.csr_matrix((vals, (filas, cols)), shape=(len(y), len(indice)))
+    return X, np.array(y, dtype=float), list(indice)
+
+def _ajustar(inicial=None):
+    X, y, pares = _sistema()
+    if not pares:
+        return {}
+    # Ridge exacto como mínimos cuadrados aumentados (el damp de lsqr regularizaría sólo x - x0)
+    A = sp.vstack([X, np.sqrt(LAMBDA) * sp.identity(len(pares), format="csr")]).tocsr()
+    b = np.concatenate([y, np.zeros(len(pares))])
+    x0 = None
+    if inicial:
+        x0 = np.array([inicial.get(par, 0.0) for par in pares], dtype=float)
+    x = lsqr(A, b, x0=x0, iter_lim=ITER_MAX)[0]
+    return {par: float(v) for par, v in zip(pares, x) if abs(v) > MINIMO}
+
+def _estado(cur):
+    """(generacion, ajustada) o None si nunca se ajustó."""
+    cur.execute("SELECT generacion, ajustada FROM sinergia_estado WHERE id = 1")
+    row = cur.fetchone()
+    return tuple(row) if row else None
+
+def _guardar(pares, generacion):
+    with get_connection() as conn:
+        conn.execute("DELETE FROM sinergia_pares")
+        conn.executemany("INSERT INTO sinergia_pares (jugador_a, jugador_b, valor) VALUES (?, ?, ?)",
+                         [(a, b, v) for (a, b), v in pares.items()])
+        conn.execute("""
+            INSERT INTO sinergia_estado (id, generacion, ajustada) VALUES (1, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET ajustada = MAX(ajustada, excluded.ajustada)
+        """, (generacion, generacion))
+        conn.commit()
+
+def reajustar():
+    """Reajuste (bloqueante) desde la historia arrancando en la solución vigente."""
+    global _pares, _cargada
+    with _ajuste:
+        with get_connection() as conn:
+            estado = _estado(conn.cursor())
+        generacion = estado[0] if estado else 0
+        with _lock:
+            inicial = _pares
+        nuevos = _ajustar(inicial=inicial)
+        _guardar(nuevos, generacion)
+        with _lock:
+            _pares, _cargada = nuevos, generacion
+    return nuevos
+
+def _reajuste_de_fondo():
+    try:
+        reajustar()
+    except Exception:
+        pass  # se reintenta en la próxima lectura (la generación sigue adelantada)
+
+def _lanzar_reajuste():
+    """Un solo hilo de reajuste a la vez; la UI no lo espera."""
+    global _hilo
+    with _lock:
+        if _hilo is not None and _hilo.is_alive():
+            return
+        _hilo = threading.Thread(target=_reajuste_de_fondo, name="sinergia", daemon=True)
+        _hilo.start()
+
+def invalidar():
+    """Tras registrar/deshacer (o reparar historial): sube la generación; se reajusta en segundo plano."""
+    with get_connection() as conn:
+        conn.execute("""
+            INSERT INTO sinergia_estado (id, generacion, ajustada) VALUES (1, 1, 0)
+            ON CONFLICT(id) DO UPDATE SET generacion = generacion + 1
+        """)
+        conn.commit()
+
+def _cargados():
+    """
+    Pares vigentes: memoria si coincide con la generación ajustada -> tabla -> ajuste completo
+    (sólo la primera vez). Si hay resultados posteriores al ajuste, lanza el reajuste de fondo.
+    """
+    global _pares, _cargada
+    with get_connection() as conn:
+        cur = conn.cursor()
+        estado = _estado(cur)
+        if estado is None:
+            pares = None
+        else:
+            with _lock:
+                pares = _pares if _cargada == estado[1] else None
+            if pares is None:
+                cur.execute("SELECT jugador_a, jugador_b, valor FROM sinergia_pares")
+                pares = {(a, b): v for a, b, v in (tuple(r) for r in cur.fetchall())}
+                with _lock:
+                    _pares, _cargada = pares, estado[1]
+    if estado is None:
+        return reajustar()
+    if estado[0] > estado[1]:
+        _lanzar_reajuste()
+    return pares
+
+# -------------------------
+# Uso en el balanceador
+# -------------------------
+def matriz(jugador_ids):
+    """Matriz simétrica (n × n) de s_ij en unidades de ELO promedio, para el orden dado."""
+    pares = _cargados()
+    n = len(jugador_ids)
+    S = np.zeros((n, n))
+    for i, j in itertools.combinations(range(n), 2):
+        a, b = sorted((jugador_ids[i], jugador_ids[j]))
+        S[i, j] = S[j, i] = pares.get((a, b), 0.0)
+    return S * ELO_POR_PUNTO
+
+def sinergia_equipos(M, S):
+    """
+    Sinergia de cada equipo para todas las particiones en una pasada.
+    M: (P × n) bool (Equipo 1), S: matriz(...). Devuelve (syn1, syn2) de largo P.
+    """
+    m1 = M.astype(float)
+    m2 = 1.0 - m1
+    return (0.5 * np.einsum("pi,ij,pj->p", m1, S, m1),
+            0.5 * np.einsum("pi,ij,pj->p", m2, S, m2))
@@ -1,34 +1,320 @@
+import numpy as np
+import pandas as pd
 from database import get_connection
+import timeline_elo
 
-# ---------- Funciones de estadísticas ----------
-def get_player_stats(jugador_id):
-    conn = get_connection()
-    cur = conn.cursor()
+# ---------- Motor de estadísticas (todos los jugadores a la vez) ----------
+# Una sola consulta (participaciones con resultado) + group-bys de pandas/NumPy.
+SQL_PARTICIPACIONES = """
+SELECT pj.jugador_id, p.id AS partido_id, p.fecha_iso AS fecha, p.es_oficial,
+       p.ganador, p.diferencia_gol, pj.equipo
+  FROM partido_jugadores pj
+  JOIN partidos p ON p.id = pj.partido_id
+ WHERE pj.equipo IN (1, 2)
+   AND (p.ganador IS NOT NULL OR p.diferencia_gol IS NOT NULL)
+   {filtro}
+"""
 
-    cur.execute("SELECT equipo FROM partido_jugadores WHERE jugador_id = ?", (jugador_id,))
-    partidos = cur.fetchall()
-    conn.close()
+COLUMNAS_STATS = [
+    "jugados", "victorias", "empates", "derrotas", "winrate", "dif_gol",
+    "racha", "mejor_racha",
+    "oficiales_jugados", "oficiales_victorias", "oficiales_empates", "oficiales_derrotas",
+    "amistosos_jugados", "amistosos_victorias", "amistosos_empates", "amistosos_derrotas",
+]
+COLUMNAS_ULTIMO = ["ultimo_partido", "ultimo_partido_id"]
 
-    total = len(partidos)
-    if total == 0:
-        return {"jugados":0, "victorias":0, "derrotas":0, "empates":0, "winrate":0}
+def _participaciones(jugador_ids=None, cur=None, excluir_partido=None):
+    """`cur` permite leer dentro de una transacción abierta (registro/undo de resultados)."""
+    filtro, params = "", ()
+    if jugador_ids:
+        filtro = "AND pj.jugador_id IN (%s)" % ",".join("?" * len(jugador_ids))
+        params = tuple(jugador_ids)
+    if excluir_partido is not None:
+        filtro += " AND p.id <> ?"
+        params += (excluir_partido,)
+    sql = SQL_PARTICIPACIONES.format(filtro=filtro)
+    if cur is None:
+        with get_connection() as conn:
+            return _participaciones_df(conn.cursor(), sql, params)
+    return _participaciones_df(cur, sql, params)
+
+def _participaciones_df(cur, sql, params):
+    cur.execute(sql, params)
+    cols = [d[0] for d in cur.description]
+    rows = [tuple(r) for r in cur.fetchall()]
+    return pd.DataFrame(rows, columns=cols)
+
+def resultados_por_jugador(df):
+    """
+    Agrega a un DataFrame de participaciones:
+    - res: +1 victoria, 0 empate, -1 derrota (ganador NULL/0 con resultado = empate)
+    - dif: diferencia de gol desde la perspectiva del jugador
+    """
+    ganador = pd.to_numeric(df["ganador"], errors="coerce").fillna(0).to_numpy()
+    equipo = df["equipo"].to_numpy()
+    res = np.where(ganador == 0, 0, np.where(ganador == equipo, 1, -1))
+    dif = pd.to_numeric(df["diferencia_gol"], errors="coerce").fillna(0).to_numpy()
+    return df.assign(res=res, dif=res * np.abs(dif))
+
+def tabla_estadisticas(jugador_ids=None, cur=None, excluir_partido=None):
+    """
+    DataFrame indexado por jugador_id con COLUMNAS_STATS:
+    jugados/victorias/empates/derrotas, winrate (%), dif_gol acumulada,
+    racha actual (+n victorias seguidas, -n derrotas, 0 si el último fue empate),
+    mejor_racha de victorias y el split oficiales/amistosos.
+    Además: ultimo_partido (fecha) y ultimo_partido_id.
+    """
+    df = _participaciones(jugador_ids, cur, excluir_partido)
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_STATS + COLUMNAS_ULTIMO, index=pd.Index([], name="jugador_id"))
+
+    df = resultados_por_jugador(df).sort_values(["jugador_id", "fecha", "partido_id"], kind="stable")
+    df["victoria"] = df["res"] == 1
+    df["empate"] = df["res"] == 0
+    df["derrota"] = df["res"] == -1
+
+    g = df.groupby("jugador_id")
+    out = pd.DataFrame({
+        "jugados": g.size(),
+        "victorias": g["victoria"].sum(),
+        "empates": g["empate"].sum(),
+        "derrotas": g["derrota"].sum(),
+        "dif_gol": g["dif"].sum(),
+    })
+    out["winrate"] = (out["victorias"] / out["jugados"] * 100).round(2)
+
+    # Rachas: corridas de resultados iguales consecutivos por jugador
+    corte = (df["res"] != df["res"].shift()) | (df["jugador_id"] != df["jugador_id"].shift())
+    corrida = corte.cumsum()
+    largo = df.groupby(corrida).cumcount() + 1
+    ultimo = df.assign(largo=largo).groupby("jugador_id").tail(1).set_index("jugador_id")
+    out["racha"] = ultimo["res"] * ultimo["largo"]
+    out["ultimo_partido"] = ultimo["fecha"]
+    out["ultimo_partido_id"] = ultimo["partido_id"]
+    out["mejor_racha"] = largo.where(df["victoria"], 0).groupby(df["jugador_id"]).max()
+
+    # Split oficiales / amistosos
+    split = df.groupby(["jugador_id", "es_oficial"]).agg(
+        jugados=("res", "size"), victorias=("victoria", "sum"),
+        empates=("empate", "sum"), derrotas=("derrota", "sum"),
+    ).unstack("es_oficial", fill_value=0)
+    for oficial, prefijo in ((1, "oficiales"), (0, "amistosos")):
+        for col in ("jugados", "victorias", "empates", "derrotas"):
+            out[f"{prefijo}_{col}"] = split[(col, oficial)] if (col, oficial) in split.columns else 0
+
+    out[COLUMNAS_STATS] = out[COLUMNAS_STATS].fillna(0)
+    return out[COLUMNAS_STATS + COLUMNAS_ULTIMO].astype({c: int for c in COLUMNAS_STATS if c != "winrate"})
+
+# ---------- Agregado por jugador mantenido por el servicio de resultados ----------
+# jugador_stats: una fila por jugador con contadores, último partido y racha actual.
+# registrar -> aplicar_resultado (UPSERT set-based de los participantes)
+# deshacer  -> revertir_resultado (resta contadores; racha/último se restauran desde *_previo
+#              si el partido deshecho era el último del jugador, si no se recalculan)
+_RES = "CASE WHEN COALESCE(p.ganador, 0) = 0 THEN 0 WHEN p.ganador = pj.equipo THEN 1 ELSE -1 END"
+
+_SQL_DELTAS = f"""
+SELECT pj.jugador_id,
+       {_RES} AS res,
+       ABS(COALESCE(p.diferencia_gol, 0)) AS dif,
+       p.es_oficial,
+       p.fecha_iso AS fecha,
+       p.id AS partido_id
+  FROM partido_jugadores pj
+  JOIN partidos p ON p.id = pj.partido_id
+ WHERE p.id = :pid AND pj.equipo IN (1, 2)
+   AND (p.ganador IS NOT NULL OR p.diferencia_gol IS NOT NULL)
+"""
+
+_SQL_CONTADORES = """
+    jugados = jugados + excluded.jugados,
+    victorias = victorias + excluded.victorias,
+    empates = empates + excluded.empates,
+    derrotas = derrotas + excluded.derrotas,
+    dif_gol = dif_gol + excluded.dif_gol,
+    oficiales_jugados = oficiales_jugados + excluded.oficiales_jugados,
+    oficiales_victorias = oficiales_victorias + excluded.oficiales_victorias,
+    oficiales_empates = oficiales_empates + excluded.oficiales_empates,
+    oficiales_derrotas = oficiales_derrotas + excluded.oficiales_derrotas
+"""
+
+_SQL_UPSERT = f"""
+INSERT INTO jugador_stats (jugador_id, jugados, victorias, empates, derrotas, dif_gol,
+                           oficiales_jugados, oficiales_victorias, oficiales_empates, oficiales_derrotas,
+                           racha, ultimo_partido, ultimo_partido_id, racha_previa)
+SELECT jugador_id, :s, :s * (res = 1), :s * (res = 0), :s * (res = -1), :s * res * dif,
+       :s * es_oficial, :s * es_oficial * (res = 1), :s * es_oficial * (res = 0), :s * es_oficial * (res = -1),
+       res, fecha, partido_id, 0
+  FROM ({_SQL_DELTAS})
+ WHERE true
+ON CONFLICT(jugador_id) DO UPDATE SET
+{_SQL_CONTADORES}
+"""
+
+# Deshacer: sólo resta sobre filas existentes (nunca inserta filas con contadores negativos)
+_SQL_RESTAR = f"""
+UPDATE jugador_stats AS js SET
+    jugados = js.jugados - 1,
+    victorias = js.victorias - (d.res = 1),
+    empates = js.empates - (d.res = 0),
+    derrotas = js.derrotas - (d.res = -1),
+    dif_gol = js.dif_gol - d.res * d.dif,
+    oficiales_jugados = js.oficiales_jugados - d.es_oficial,
+    oficiales_victorias = js.oficiales_victorias - d.es_oficial * (d.res = 1),
+    oficiales_empates = js.oficiales_empates - d.es_oficial * (d.res = 0),
+    oficiales_derrotas = js.oficiales_derrotas - d.es_oficial * (d.res = -1)
+  FROM ({_SQL_DELTAS}) AS d
+ WHERE d.jugador_id = js.jugador_id
+"""
 
-    victorias = sum(1 for p in partidos if p[0] == 1)  # simplificado
-    derrotas = sum(1 for p in partidos if p[0] == 2)
-    empates = sum(1 for p in partidos if p[0] == 0)
-    winrate = (victorias / total) * 100
+_SQL_AVANZAR_RACHA = """,
+    racha_previa = racha,
+    ultimo_previo = ultimo_partido,
+    ultimo_previo_id = ultimo_partido_id,
+    racha = CASE WHEN excluded.racha = 1 AND racha > 0 THEN racha + 1
+                 WHEN excluded.racha = -1 AND racha < 0 THEN racha - 1
+                 ELSE excluded.racha END,
+    ultimo_partido = excluded.ultimo_partido,
+    ultimo_partido_id = excluded.ultimo_partido_id
+"""
+
+def _sin_fila(cur, jugador_ids):
+    """Jugadores de la lista que todavía no tienen fila en jugador_stats."""
+    if not jugador_ids:
+        return []
+    cur.execute("SELECT jugador_id FROM jugador_stats WHERE jugador_id IN (%s)" % ",".join("?" * len(jugador_ids)),
+                tuple(jugador_ids))
+    existentes = {r[0] for r in cur.fetchall()}
+    return [j for j in jugador_ids if j not in existentes]
+
+def _participantes(cur, partido_id):
+    cur.execute("SELECT jugador_id FROM partido_jugadores WHERE partido_id = ? AND equipo IN (1, 2)",
+                (partido_id,))
+    return [r[0] for r in cur.fetchall()]
+
+def _guardar_filas(cur, tabla):
+    cur.executemany("""
+        INSERT OR REPLACE INTO jugador_stats
+            (jugador_id, jugados, victorias, empates, derrotas, dif_gol,
+             oficiales_jugados, oficiales_victorias, oficiales_empates, oficiales_derrotas,
+             racha, ultimo_partido, ultimo_partido_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(int(jid), int(f.jugados), int(f.victorias), int(f.empates), int(f.derrotas), int(f.dif_gol),
+           int(f.oficiales_jugados), int(f.oficiales_victorias), int(f.oficiales_empates),
+           int(f.oficiales_derrotas), int(f.racha), f.ultimo_partido, int(f.ultimo_partido_id))
+          for jid, f in tabla.iterrows()])
+
+def recalcular_jugadores(cur, jugador_ids, excluir_partido=None):
+    """Recalcula desde la historia las filas de unos pocos jugadores (casos fuera de orden)."""
+    if not jugador_ids:
+        return
+    tabla = tabla_estadisticas(jugador_ids, cur=cur, excluir_partido=excluir_partido)
+    cur.execute("DELETE FROM jugador_stats WHERE jugador_id IN (%s)" % ",".join("?" * len(jugador_ids)),
+                tuple(jugador_ids))
+    _guardar_filas(cur, tabla)
+
+def aplicar_resultado(cur, partido_id: int):
+    """Suma el resultado (ya guardado en `partidos`) a jugador_stats, en la transacción de `cur`."""
+    # Si el partido es anterior al último de algún jugador, la racha no se puede avanzar: recalcular
+    cur.execute("""
+        SELECT js.jugador_id
+          FROM jugador_stats js
+          JOIN partido_jugadores pj ON pj.jugador_id = js.jugador_id
+          JOIN partidos p ON p.id = pj.partido_id
+         WHERE p.id = ? AND pj.equipo IN (1, 2)
+           AND (js.ultimo_partido > p.fecha_iso
+                OR (js.ultimo_partido = p.fecha_iso AND js.ultimo_partido_id > p.id))
+    """, (partido_id,))
+    fuera_de_orden = [r[0] for r in cur.fetchall()]
+    # Sin fila previa: el INSERT sólo contaría este partido; se recalcula desde la historia
+    fuera_de_orden += _sin_fila(cur, _participantes(cur, partido_id))
+
+    cur.execute(_SQL_UPSERT + _SQL_AVANZAR_RACHA, {"pid": partido_id, "s": 1})
+    recalcular_jugadores(cur, fuera_de_orden)
+
+def revertir_resultado(cur, partido_id: int):
+    """Resta el resultado de jugador_stats (llamar ANTES de limpiar ganador/diferencia_gol)."""
+    cur.execute(_SQL_DELTAS, {"pid": partido_id})
+    participantes = [r[0] for r in cur.fetchall()]
+    if not participantes:
+        return  # el partido no tenía resultado
+    # Sin fila (p. ej. backfill salteado): se arma desde la historia sin este partido
+    faltantes = _sin_fila(cur, participantes)
+    cur.execute(_SQL_RESTAR, {"pid": partido_id})
+    recalcular_jugadores(cur, faltantes, excluir_partido=partido_id)
+    marcas = ",".join("?" * len(participantes))
+    # Caso normal (se deshace el último partido del jugador): restaurar en O(1)
+    cur.execute(f"""
+        UPDATE jugador_stats
+           SET racha = racha_previa,
+               ultimo_partido = ultimo_previo,
+               ultimo_partido_id = ultimo_previo_id,
+               racha_previa = NULL, ultimo_previo = NULL, ultimo_previo_id = NULL
+         WHERE jugador_id IN ({marcas})
+           AND ultimo_partido_id = ?
+           AND racha_previa IS NOT NULL
+    """, (*participantes, partido_id))
+    cur.execute(f"""
+        SELECT jugador_id FROM jugador_stats
+         WHERE jugador_id IN ({marcas})
+           AND (ultimo_partido_id = ? OR ultimo_partido > (SELECT fecha_iso FROM partidos WHERE id = ?))
+    """, (*participantes, partido_id, partido_id))
+    recalcular_jugadores(cur, [r[0] for r in cur.fetchall()], excluir_partido=partido_id)
+
+def reconstruir_jugador_stats(cur):
+    cur.execute("DELETE FROM jugador_stats")
+    _guardar_filas(cur, tabla_estadisticas(cur=cur))
+
+_stats_verificadas = False
+
+def asegurar_jugador_stats():
+    """
+    Backfill de jugador_stats (una vez por proceso): completa si está vacía y, si no, agrega
+    los jugadores con resultados que todavía no tienen fila.
+    """
+    global _stats_verificadas
+    if _stats_verificadas:
+        return
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT EXISTS (SELECT 1 FROM jugador_stats)")
+        if not cur.fetchone()[0]:
+            reconstruir_jugador_stats(cur)
+        else:
+            cur.execute("""
+                SELECT DISTINCT pj.jugador_id
+                  FROM partido_jugadores pj
+                  JOIN partidos p ON p.id = pj.partido_id
+                 WHERE pj.equipo IN (1, 2)
+                   AND (p.ganador IS NOT NULL OR p.diferencia_gol IS NOT NULL)
+                   AND NOT EXISTS (SELECT 1 FROM jugador_stats js WHERE js.jugador_id = pj.jugador_id)
+            """)
+            recalcular_jugadores(cur, [r[0] for r in cur.fetchall()])
+        conn.commit()
+    _stats_verificadas = True
+
+def fila_jugador(jugador_id):
+    """Lectura por PRIMARY KEY del agregado del jugador (dict o None)."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM jugador_stats WHERE jugador_id = ?", (jugador_id,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return dict(zip([d[0] for d in cur.description], tuple(row)))
+
+# ---------- Funciones de estadísticas ----------
+def get_player_stats(jugador_id):
+    fila = fila_jugador(jugador_id)
+    if not fila or fila["jugados"] == 0:
+        return {"jugados":0, "victorias":0, "derrotas":0, "empates":0, "winrate":0}
     return {
-        "jugados": total,
-        "victorias": victorias,
-        "derrotas": derrotas,
-        "empates": empates,
-        "winrate": round(winrate, 2)
+        "jugados": fila["jugados"],
+        "victorias": fila["victorias"],
+        "derrotas": fila["derrotas"],
+        "empates": fila["empates"],
+        "winrate": round(fila["victorias"] / fila["jugados"] * 100, 2),
     }
 
 def get_elo_history(jugador_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT partido_id, elo_despues FROM historial_elo WHERE jugador_id = ? ORDER BY partido_id", (jugador_id,))
-    rows = cur.fetchall()
-    conn.close()
-    return [r[1] for r in rows], [r[0] for r in rows]
+    rows = timeline_elo.historial_jugador(jugador_id)
+    return [r[3] for r in rows], [r[1] for r in rows]
@@ -0,0 +1,36 @@
+# test_prediccion.py
+# El paso online de prediccion (Newton con información acumulada) debe quedar cerca del ajuste
+# completo sobre la misma historia. Datos sintéticos: no usa la base.
+
+import numpy as np
+import prediccion
+
+VERDADEROS = np.array([np.log(10.0), 0.1, np.log(0.15)])
+
+def _partidos(n, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(0.0, 0.25, n)
+    p1, pe, _ = prediccion._probs_params(VERDADEROS, x)
+    u = rng.random(n)
+    y = np.where(u < p1, 2, np.where(u < p1 + pe, 1, 0))
+    return x, y
+
+def test_ajuste_completo_es_optimo():
+    x, y = _partidos(1000)
+    params = prediccion._ajustar_params(x, y)
+    g = prediccion._gradiente(params, x, y) - prediccion.LAMBDA_PRIOR * (params - prediccion.PRIOR)
+    assert np.abs(g).max() < 1e-4
+
+def test_online_cerca_del_ajuste_completo():
+    x, y = _partidos(1000)
+    completo = prediccion._ajustar_params(x, y)
+
+    inicio = 200
+    params = prediccion._ajustar_params(x[:inicio], y[:inicio])
+    info = prediccion._informacion(params, x[:inicio], y[:inicio])
+    for i in range(inicio, len(x)):
+        params, info = prediccion._paso_online(params, info, x[i:i + 1], y[i:i + 1])
+
+    assert np.abs(params - completo).max() < 0.05
+    # y casi la misma verosimilitud que el óptimo
+    assert prediccion._logver(completo, x, y) - prediccion._logver(params, x, y) < 0.1
@@ -0,0 +1,129 @@
+# timeline_elo.py
+# Línea de tiempo materializada de ELO por jugador: (jugador, fecha del partido, partido, elo).
+# Se mantiene al registrar/deshacer resultados y responde "ELO al día D" con búsquedas por índice
+# (PRIMARY KEY (jugador_id, fecha, partido_id)) en vez de JOIN + ORDER BY sobre todo el historial.
+
+from database import get_connection
+
+_verificada = False  # una verificación/backfill por proceso (main.py se re-ejecuta en cada rerun)
+
+SQL_FILAS_DESDE_HISTORIAL = """
+    SELECT he.jugador_id, p.fecha_iso, he.partido_id, he.elo_antes, he.elo_despues
+      FROM historial_elo he
+      JOIN partidos p ON p.id = he.partido_id
+"""
+
+# -------------------------
+# Mantenimiento
+# -------------------------
+def agregar_partido(cur, partido_id: int):
+    """Materializa las filas de historial_elo de un partido (usar dentro de la transacción del resultado)."""
+    cur.execute(
+        "INSERT OR REPLACE INTO elo_timeline (jugador_id, fecha, partido_id, elo_antes, elo) "
+        + SQL_FILAS_DESDE_HISTORIAL + " WHERE he.partido_id = ?",
+        (partido_id,),
+    )
+
+def quitar_partido(cur, partido_id: int):
+    cur.execute("DELETE FROM elo_timeline WHERE partido_id = ?", (partido_id,))
+
+def reconstruir(cur):
+    """Regenera toda la línea de tiempo desde historial_elo."""
+    cur.execute("DELETE FROM elo_timeline")
+    cur.execute(
+        "INSERT OR REPLACE INTO elo_timeline (jugador_id, fecha, partido_id, elo_antes, elo) "
+        + SQL_FILAS_DESDE_HISTORIAL
+    )
+
+def asegurar_timeline():
+    """Backfill si la tabla está desincronizada (solo la primera vez por proceso)."""
+    global _verificada
+    if _verificada:
+        return
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM elo_timeline")
+        n_timeline = cur.fetchone()[0]
+        cur.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT DISTINCT he.jugador_id, he.partido_id
+                  FROM historial_elo he
+                  JOIN partidos p ON p.id = he.partido_id
+            )
+        """)
+        n_historial = cur.fetchone()[0]
+        if n_timeline != n_historial:
+            reconstruir(cur)
+            conn.commit()
+    _verificada = True
+
+# -------------------------
+# Consultas
+# -------------------------
+def historial_jugador(jugador_id: int):
+    """Lista de (fecha, partido_id, elo_antes, elo) en orden cronológico (range scan sobre la PK)."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT fecha, partido_id, elo_antes, elo
+              FROM elo_timeline
+             WHERE jugador_id = ?
+          ORDER BY fecha ASC, partido_id ASC
+        """, (jugador_id,))
+        return [tuple(r) for r in cur.fetchall()]
+
+def elo_en_fecha(jugador_id: int, fecha: str):
+    """
+    ELO del jugador al final del día `fecha` ('YYYY-MM-DD').
+    - Antes de su primer partido: el elo_antes de ese primer partido.
+    - Sin historial: elo_actual (o None si el jugador no existe).
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT elo FROM elo_timeline
+             WHERE jugador_id = ? AND fecha <= ?
+          ORDER BY fecha DESC, partido_id DESC
+             LIMIT 1
+        """, (jugador_id, fecha))
+        row = cur.fetchone()
+        if row:
+            return row[0]
+        cur.execute("""
+            SELECT elo_antes FROM elo_timeline
+             WHERE jugador_id = ?
+          ORDER BY fecha ASC, partido_id ASC
+             LIMIT 1
+        """, (jugador_id,))
+        row = cur.fetchone()
+        if row:
+            return row[0]
+        cur.execute("SELECT elo_actual FROM jugadores WHERE id = ?", (jugador_id,))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+def elos_en_fecha(fecha: str):
+    """
+    {jugador_id: elo} al final del día `fecha`, solo jugadores que ya habían jugado algún oficial.
+    Una búsqueda por índice por jugador (no recorre el historial completo).
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT j.id,
+                   (SELECT t.elo FROM elo_timeline t
+                     WHERE t.jugador_id = j.id AND t.fecha <= ?
+                  ORDER BY t.fecha DESC, t.partido_id DESC
+                     LIMIT 1) AS elo
+              FROM jugadores j
+        """, (fecha,))
+        return {r[0]: r[1] for r in cur.fetchall() if r[1] is not None}
+
+def ranking_en_fecha(jugador_id: int, fecha: str):
+    """(posición, total) del jugador en el ranking al día `fecha`, o None si aún no había jugado."""
+    elos = elos_en_fecha(fecha)
+    propio = elos.get(jugador_id)
+    if propio is None:
+        return None
+    posicion = 1 + sum(1 for e in elos.values() if e > propio)
+    return posicion, len(elos)